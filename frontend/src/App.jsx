@@ -20,6 +20,28 @@ import {
 import ReactMarkdown from 'react-markdown';
 import './App.css';
 
+// Session diffs: an RFC 7386 merge patch plus items appended to lists
+const applyMergePatch = (target, patch) => {
+  if (patch === null || typeof patch !== 'object' || Array.isArray(patch)) return patch;
+  const result = (target && typeof target === 'object' && !Array.isArray(target)) ? { ...target } : {};
+  Object.entries(patch).forEach(([key, value]) => {
+    if (value === null) {
+      delete result[key];
+    } else {
+      result[key] = applyMergePatch(result[key], value);
+    }
+  });
+  return result;
+};
+
+const applyStateDiff = (state, diff) => {
+  const result = applyMergePatch(state, diff.patch || {});
+  Object.entries(diff.append || {}).forEach(([key, items]) => {
+    result[key] = [...(result[key] || []), ...items];
+  });
+  return result;
+};
+
 const App = () => {
   const [feedback, setFeedback] = useState('');
   const [isGenerating, setIsGenerating] = useState(false);
@@ -33,6 +55,7 @@ const App = () => {
     return saved ? JSON.parse(saved) : [];
   });
   const [currentView, setCurrentView] = useState('current');
+  const [upgrading, setUpgrading] = useState({});  // preview drafts being rendered at full size
   
   // Voice recording states
   const [isRecording, setIsRecording] = useState(false);
@@ -67,8 +90,65 @@ const App = () => {
     };
   });
   
+  // Server-side session holding the genome: { id, version }
+  const [session, setSession] = useState(() => {
+    const saved = localStorage.getItem('dream_livin_session');
+    return saved ? JSON.parse(saved) : null;
+  });
+  const sessionRef = useRef(session);
+  const genomeRef = useRef(livinGenome);
+  useEffect(() => { sessionRef.current = session; }, [session]);
+  useEffect(() => { genomeRef.current = livinGenome; }, [livinGenome]);
+  
   const pollInterval = useRef(null);
   
+  const adoptSession = (data) => {
+    const next = { id: data.session_id, version: data.version };
+    sessionRef.current = next;
+    genomeRef.current = data.state;
+    setSession(next);
+    setLivinGenome(data.state);
+    return next;
+  };
+  
+  // Create a session seeded with the local genome the first time it is needed
+  const ensureSession = async () => {
+    if (sessionRef.current) return sessionRef.current;
+    const res = await fetch('/api/sessions', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ state: genomeRef.current })
+    });
+    return adoptSession(await res.json());
+  };
+  
+  // Reload the session after a version conflict (or recreate it if it expired)
+  const resyncSession = async () => {
+    const current = sessionRef.current;
+    if (current) {
+      const res = await fetch(`/api/sessions/${current.id}`);
+      if (res.ok) return adoptSession(await res.json());
+    }
+    sessionRef.current = null;
+    return ensureSession();
+  };
+  
+  // Apply a state diff from the server, resyncing if we missed a version
+  const applySessionDiff = async (diff) => {
+    const current = sessionRef.current;
+    if (!current || diff.base_version !== current.version) {
+      await resyncSession();
+      return genomeRef.current;
+    }
+    const next = applyStateDiff(genomeRef.current, diff);
+    const nextSession = { ...current, version: diff.version };
+    sessionRef.current = nextSession;
+    genomeRef.current = next;
+    setSession(nextSession);
+    setLivinGenome(next);
+    return next;
+  };
+  
   // Audio recording functions
   const startRecording = async () => {
     try {
@@ -165,17 +245,44 @@ const App = () => {
       const formData = new FormData();
       formData.append('audio_file', audioBlob, 'recording.webm');
       
-      const response = await fetch('/api/transcribe', {
+      // Long notes are transcribed in chunks; show the text as chunks finish
+      const response = await fetch('/api/transcribe/stream', {
         method: 'POST',
         body: formData
       });
       
-      if (!response.ok) throw new Error('Transcription failed');
+      if (!response.ok || !response.body) throw new Error('Transcription failed');
       
-      const result = await response.json();
-      if (result.text) {
-        setFeedback(prev => prev + (prev ? ' ' : '') + result.text);
+      let base = null;
+      const showText = (text) => {
+        setFeedback(prev => {
+          if (base === null) base = prev;
+          return base + (base && text ? ' ' : '') + text;
+        });
+      };
+      
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        for (const message of messages) {
+          const event = message.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(message.match(/^data: (.*)$/m)?.[1] || '{}');
+          if (event === 'partial' || event === 'completed') {
+            showText(data.text || '');
+            finished = event === 'completed';
+          } else if (event === 'failed') {
+            throw new Error(data.detail || 'Transcription failed');
+          }
+        }
       }
+      if (!finished) throw new Error('Transcription stream ended early');
     } catch (err) {
       console.error("Transcription error:", err);
       alert("Failed to transcribe audio. Please try again.");
@@ -228,9 +335,26 @@ const App = () => {
   };
   
   const saveDNAEdits = async () => {
-    const updatedGenome = { ...livinGenome, livin_dna: tempDNA.slice(0, 8) };
-    setLivinGenome(updatedGenome);
+    const updatedDNA = tempDNA.slice(0, 8);
+    setLivinGenome(prev => ({ ...prev, livin_dna: updatedDNA }));
     setEditingDNA(false);
+    
+    // Apply the edit to the server-side session in place
+    try {
+      const current = await ensureSession();
+      const res = await fetch('/api/dna/update', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ session_id: current.id, base_version: current.version, updated_dna: updatedDNA })
+      });
+      if (res.ok) {
+        await applySessionDiff((await res.json()).state_diff);
+      } else {
+        await resyncSession();
+      }
+    } catch (err) {
+      console.error("DNA update error:", err);
+    }
   };
   
   const cancelDNAEdits = () => {
@@ -265,39 +389,88 @@ const App = () => {
     };
   }, []);
   
-  // Poll for status
+  // Track task progress: SSE stream with polling fallback
   useEffect(() => {
-    if (taskId) {
+    if (!taskId) return;
+    
+    let finished = false;
+    let eventSource = null;
+    
+    const finishTask = async (data) => {
+      if (finished) return;
+      finished = true;
+      if (eventSource) eventSource.close();
+      clearInterval(pollInterval.current);
+      setStatus(data);
+      setIsGenerating(false);
+      setTaskId(null);
+      
+      if (data.status === 'completed') {
+        if (data.state_diff) {
+          // Session rounds send only what changed; keep the full state per round locally
+          const nextGenome = await applySessionDiff(data.state_diff);
+          setHistory(prev => [...prev, { ...data, updated_state: nextGenome }]);
+        } else {
+          setHistory(prev => [...prev, data]);
+          if (data.updated_state) {
+            setLivinGenome(data.updated_state);
+          }
+        }
+        // Clear uploaded images after successful generation
+        setReferenceImages([]);
+        setEnvironmentImage(null);
+        setSketchImage(null);
+      } else if (data.status !== 'cancelled') {
+        alert("Generation failed: " + data.error);
+      }
+    };
+    
+    const handleTaskData = (data) => {
+      if (data.status === 'completed' || data.status === 'failed' || data.status === 'cancelled') {
+        finishTask(data);
+      } else {
+        setStatus(data);
+      }
+    };
+    
+    const startPolling = () => {
       pollInterval.current = setInterval(async () => {
         try {
           const res = await fetch(`/api/status/${taskId}`);
-          const data = await res.json();
-          setStatus(data);
-          
-          if (data.status === 'completed') {
-            clearInterval(pollInterval.current);
-            setIsGenerating(false);
-            setTaskId(null);
-            setHistory(prev => [...prev, data]);
-            if (data.updated_state) {
-              setLivinGenome(data.updated_state);
-            }
-            // Clear uploaded images after successful generation
-            setReferenceImages([]);
-            setEnvironmentImage(null);
-            setSketchImage(null);
-          } else if (data.status === 'failed') {
-            clearInterval(pollInterval.current);
-            setIsGenerating(false);
-            setTaskId(null);
-            alert("Generation failed: " + data.error);
-          }
+          handleTaskData(await res.json());
         } catch (err) {
           console.error("Polling error:", err);
         }
       }, 3000);
+    };
+    
+    if (window.EventSource) {
+      eventSource = new EventSource(`/api/events/${taskId}`);
+      eventSource.addEventListener('snapshot', (e) => handleTaskData(JSON.parse(e.data)));
+      // Status changes and finished images both carry the changed task fields
+      const mergeFields = (e) => {
+        const fields = JSON.parse(e.data);
+        setStatus(prev => ({ ...prev, ...fields }));
+      };
+      eventSource.addEventListener('status', mergeFields);
+      eventSource.addEventListener('image', mergeFields);
+      eventSource.addEventListener('completed', (e) => finishTask(JSON.parse(e.data)));
+      eventSource.addEventListener('failed', (e) => finishTask(JSON.parse(e.data)));
+      eventSource.addEventListener('cancelled', (e) => finishTask(JSON.parse(e.data)));
+      eventSource.onerror = () => {
+        if (finished) return;
+        eventSource.close();
+        startPolling();
+      };
+    } else {
+      startPolling();
     }
-    return () => clearInterval(pollInterval.current);
+    
+    return () => {
+      finished = true;
+      if (eventSource) eventSource.close();
+      clearInterval(pollInterval.current);
+    };
   }, [taskId]);
   
   // Persistence
@@ -305,7 +478,12 @@ const App = () => {
     localStorage.setItem('dream_livin_history', JSON.stringify(history));
     localStorage.setItem('dream_livin_genome', JSON.stringify(livinGenome));
     localStorage.setItem('dream_livin_status', JSON.stringify(status));
-  }, [history, livinGenome, status]);
+    if (session) {
+      localStorage.setItem('dream_livin_session', JSON.stringify(session));
+    } else {
+      localStorage.removeItem('dream_livin_session');
+    }
+  }, [history, livinGenome, status, session]);
   
   const handleGenerate = async () => {
     if (!feedback.trim() && livinGenome.round > 0 && referenceImages.length === 0 && !environmentImage && !sketchImage) {
@@ -316,30 +494,48 @@ const App = () => {
     setStatus({ status: 'queued' });
     
     try {
-      const formData = new FormData();
-      formData.append('feedback', feedback || "Start the initial exploration with diverse modular home concepts for Earth and Mars.");
-      formData.append('state', JSON.stringify(livinGenome));
-      
-      // Append images
-      referenceImages.forEach(img => {
-        formData.append('reference_images', img.file);
-      });
-      
-      if (environmentImage) {
-        formData.append('environment_image', environmentImage.file);
-      }
+      // The server holds the genome; send only the session id and version
+      const submit = (current) => {
+        const formData = new FormData();
+        formData.append('feedback', feedback || "Start the initial exploration with diverse modular home concepts for Earth and Mars.");
+        formData.append('session_id', current.id);
+        formData.append('base_version', current.version);
+        
+        // Append images
+        referenceImages.forEach(img => {
+          formData.append('reference_images', img.file);
+        });
+        
+        if (environmentImage) {
+          formData.append('environment_image', environmentImage.file);
+        }
+        
+        if (sketchImage) {
+          formData.append('sketch_image', sketchImage.file);
+        }
+        
+        return fetch('/api/feedback', {
+          method: 'POST',
+          body: formData
+        });
+      };
       
-      if (sketchImage) {
-        formData.append('sketch_image', sketchImage.file);
+      let res = await submit(await ensureSession());
+      if (res.status === 404 || res.status === 409) {
+        // Session expired or changed elsewhere: resync and try once more
+        res = await submit(await resyncSession());
       }
       
-      const res = await fetch('/api/feedback', {
-        method: 'POST',
-        body: formData
-      });
-      
       const data = await res.json();
+      if (!res.ok) {
+        const retryAfter = res.headers.get('Retry-After');
+        setIsGenerating(false);
+        setStatus(null);
+        alert((data.detail || "Generation could not start.") + (retryAfter ? ` Try again in ${retryAfter}s.` : ''));
+        return;
+      }
       setTaskId(data.task_id);
+      setStatus({ status: 'Waiting in queue...', queue_position: data.queue_position });
       setFeedback('');
     } catch (err) {
       console.error("Generation error:", err);
@@ -347,11 +543,76 @@ const App = () => {
     }
   };
   
+  const cancelGeneration = async () => {
+    if (!taskId) return;
+    try {
+      const res = await fetch(`/api/tasks/${taskId}/cancel`, { method: 'POST' });
+      if (!res.ok) {
+        const data = await res.json();
+        alert(data.detail || "This round could not be cancelled.");
+      }
+      // The progress stream delivers the cancelled task and ends the round
+    } catch (err) {
+      console.error("Cancel error:", err);
+    }
+  };
+  
   const currentDisplayData = currentView === 'current' ? status : history[currentView];
   const currentGenome = (currentView === 'current' || !history[currentView]?.updated_state)
     ? livinGenome
     : history[currentView].updated_state;
   
+  // Archived rounds only need the small server-side thumbnails
+  const imageSrc = (img) => (currentView !== 'current' && img.thumb_url) ? img.thumb_url : img.url;
+  
+  // Preview drafts are rendered at full resolution when the user opens them
+  const upgradeImage = async (img) => {
+    if (!img.preview || currentView !== 'current' || isGenerating || !status?.id) return;
+    const key = `${status.id}_${img.index}`;
+    if (upgrading[key]) return;
+    setUpgrading(prev => ({ ...prev, [key]: true }));
+    try {
+      const res = await fetch(`/api/tasks/${status.id}/upgrade/${img.index}`, { method: 'POST' });
+      if (!res.ok) throw new Error((await res.json()).detail);
+      const full = await res.json();
+      const swap = (data) => {
+        if (!data || data.id !== status.id) return data;
+        const group = `${full.environment}_images`;
+        return { ...data, [group]: data[group].map(i => i.index === full.index ? full : i) };
+      };
+      setStatus(prev => swap(prev));
+      setHistory(prev => prev.map(swap));
+    } catch (err) {
+      console.error("Upgrade error:", err);
+    } finally {
+      setUpgrading(prev => {
+        const next = { ...prev };
+        delete next[key];
+        return next;
+      });
+    }
+  };
+  
+  const renderImageCard = (img, i) => (
+    <div
+      key={i}
+      className={`image-card ${img.type}${img.preview ? ' preview' : ''}`}
+      onClick={() => upgradeImage(img)}
+    >
+      <div className="type-badge">{img.type}</div>
+      {img.preview && (
+        <div className="preview-badge">
+          {upgrading[`${status?.id}_${img.index}`] ? 'Rendering...' : 'Draft'}
+        </div>
+      )}
+      <img src={imageSrc(img)} alt={img.name} loading="lazy" />
+      <div className="image-info">
+        <h4>{img.name}</h4>
+        <p>{img.prompt}</p>
+      </div>
+    </div>
+  );
+  
   const hasUploadedImages = referenceImages.length > 0 || environmentImage || sketchImage;
   
   return (
@@ -378,12 +639,15 @@ const App = () => {
                   feedback_history: []
                 });
                 setCurrentView('current');
+                setSession(null);
+                sessionRef.current = null;
                 setReferenceImages([]);
                 setEnvironmentImage(null);
                 setSketchImage(null);
                 localStorage.removeItem('dream_livin_history');
                 localStorage.removeItem('dream_livin_genome');
                 localStorage.removeItem('dream_livin_status');
+                localStorage.removeItem('dream_livin_session');
               }
             }}
           >
@@ -409,16 +673,7 @@ const App = () => {
             </div>
           ) : (
             <div className="image-grid">
-              {currentDisplayData?.earth_images?.map((img, i) => (
-                <div key={i} className={`image-card ${img.type}`}>
-                  <div className="type-badge">{img.type}</div>
-                  <img src={img.url} alt={img.name} />
-                  <div className="image-info">
-                    <h4>{img.name}</h4>
-                    <p>{img.prompt}</p>
-                  </div>
-                </div>
-              ))}
+              {currentDisplayData?.earth_images?.map(renderImageCard)}
             </div>
           )}
         </div>
@@ -438,16 +693,7 @@ const App = () => {
             </div>
           ) : (
             <div className="image-grid">
-              {currentDisplayData?.mars_images?.map((img, i) => (
-                <div key={i} className={`image-card ${img.type}`}>
-                  <div className="type-badge">{img.type}</div>
-                  <img src={img.url} alt={img.name} />
-                  <div className="image-info">
-                    <h4>{img.name}</h4>
-                    <p>{img.prompt}</p>
-                  </div>
-                </div>
-              ))}
+              {currentDisplayData?.mars_images?.map(renderImageCard)}
             </div>
           )}
         </div>
@@ -652,8 +898,19 @@ const App = () => {
           <div className="loader large"></div>
           <div className="status-text">
             <span className="status-main">{status?.status || 'Initializing...'}</span>
-            <span className="status-sub">Creating your Earth & Mars visions...</span>
+            <span className="status-sub">
+              {status?.queue_position > 0
+                ? `Position ${status.queue_position} in line...`
+                : status?.images_total
+                  ? `${status.images_completed || 0} of ${status.images_total} visions ready...`
+                  : 'Creating your Earth & Mars visions...'}
+            </span>
           </div>
+          {taskId && (
+            <button className="btn-cancel" onClick={cancelGeneration}>
+              Cancel
+            </button>
+          )}
         </div>
       )}
     </div>
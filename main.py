@@ -4,18 +4,35 @@ Helps users discover and refine their dream home design for Earth and Mars.
 """
 import os
 import asyncio
+import copy
 import json
+import time
 import uuid
-import base64
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 from typing import List, Optional
-from fastapi import FastAPI, BackgroundTasks, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from services.ai_client import AIClient
 from services.prompt_engine import PromptEngine
+from services.progress import ProgressBroker, TERMINAL_EVENTS, format_sse
+from services.task_store import create_task_store
+from services.scheduler import GenerationScheduler, QueueFullError
+from services.image_cache import ImageCache
+from services.image_index import ImageIndex
+from services.derivatives import DerivativeBuilder, VARIANTS, variant_filename
+from services.plan_cache import PlanCache
+from services.uploads import UploadProcessor, upload_digest
+from services.errors import UpstreamError, CircuitOpenError
+from services.retry import create_retry_engine
+from services.singleflight import SingleFlight
+from services.plan_stream import PlanStreamParser
+from services.sessions import SessionManager, VersionConflictError
+from services.audio import AudioPipeline, AudioChunk, transcribe_chunks
+from services import metrics, tracing
 
 load_dotenv()
 
@@ -25,85 +42,898 @@ app = FastAPI(title="Dream LIVIN Shop", version="1.0.0")
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
 IMAGE_DIR = os.path.join(OUTPUT_DIR, "images")
+IMAGE_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "images")
+UPLOAD_DIR = os.path.join(OUTPUT_DIR, "uploads")
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 os.makedirs(IMAGE_DIR, exist_ok=True)
 os.makedirs(STATIC_DIR, exist_ok=True)
 
+# Constants
+MAX_IMAGE_COUNT = int(os.getenv("MAX_IMAGE_COUNT", "1000"))
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", "0"))  # 0 = no byte budget
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", str(MAX_IMAGE_COUNT)))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_STORE_POLL_SECONDS = float(os.getenv("SSE_STORE_POLL_SECONDS", "2"))
+# Generated filenames are unique, so browsers and proxies may keep them forever
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", "2"))
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", "1024"))
+UPLOAD_MAX_COUNT = int(os.getenv("UPLOAD_MAX_COUNT", "1000"))
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "4"))
+GENERATION_QUEUE_SIZE = int(os.getenv("GENERATION_QUEUE_SIZE", "50"))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "256"))
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", "600"))
+PLAN_STREAMING_ENABLED = os.getenv("PLAN_STREAMING_ENABLED", "false").lower() == "true"
+FULL_IMAGE_SIZE = "1536x1024"  # 16:9
+PREVIEW_MODE_ENABLED = os.getenv("PREVIEW_MODE_ENABLED", "false").lower() == "true"
+PREVIEW_IMAGE_SIZE = os.getenv("PREVIEW_IMAGE_SIZE", "768x512")
+PREVIEW_AUTO_UPGRADE = os.getenv("PREVIEW_AUTO_UPGRADE", "true").lower() == "true"
+IMAGE_BATCHING_ENABLED = os.getenv("IMAGE_BATCHING_ENABLED", "false").lower() == "true"
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+SPECULATIVE_PLANNING_ENABLED = os.getenv("SPECULATIVE_PLANNING_ENABLED", "false").lower() == "true"
+SPECULATIVE_MAX_IN_FLIGHT = int(os.getenv("SPECULATIVE_MAX_IN_FLIGHT", "2"))
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+# Sent by the frontend when the feedback box is empty; empty feedback plans with it too
+DEFAULT_FEEDBACK = "Start the initial exploration with diverse modular home concepts for Earth and Mars."
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "604800"))  # 7 days
+
 # Shared instances
 ai_client = AIClient()
 prompt_engine = PromptEngine()
 
-# In-memory storage for generation status
-active_tasks = {}
+# Per-operation retry policies and circuit breakers for upstream calls
+upstream_retry = create_retry_engine()
 
-# Constants
-MAX_IMAGE_COUNT = int(os.getenv("MAX_IMAGE_COUNT", "1000"))
+# Identical concurrent plan/image requests share one upstream call, retries included
+single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+
+# Bounded storage for generation status (in-process LRU/TTL or shared SQLite)
+active_tasks = create_task_store(default_path=os.path.join(OUTPUT_DIR, "tasks.db"))
+
+# Versioned server-side LIVIN DNA state, stored through the same backend as tasks
+sessions = SessionManager(create_task_store(
+    table="sessions",
+    default_path=os.path.join(OUTPUT_DIR, "tasks.db"),
+    max_entries=SESSION_MAX_ENTRIES,
+    ttl_seconds=SESSION_TTL_SECONDS
+))
+
+# Push channel for task progress (SSE)
+progress_broker = ProgressBroker()
+
+# Ordered index of saved images for incremental retention
+image_index = ImageIndex(IMAGE_DIR, max_count=MAX_IMAGE_COUNT, max_bytes=MAX_IMAGE_BYTES)
+
+# Thumbnail/WebP/AVIF encoder (process pool)
+derivative_builder = DerivativeBuilder(max_workers=DERIVATIVE_WORKERS)
+derivative_tasks = set()
+
+# Latest generation task per session; a newer round supersedes it
+session_rounds = {}
+
+# On-demand full renders of preview drafts, keyed by (task_id, index)
+image_upgrades = {}
+upgrade_record_lock = asyncio.Lock()
+
+# Content-addressed cache of rendered images, keyed on the final prompt
+image_cache = ImageCache(IMAGE_CACHE_DIR, max_entries=IMAGE_CACHE_MAX_ENTRIES)
+
+# Spooled, downscaled and deduplicated user uploads
+upload_processor = UploadProcessor(UPLOAD_DIR, max_side=UPLOAD_MAX_SIDE, max_count=UPLOAD_MAX_COUNT)
+
+# Silence trimming, resampling and chunking of voice notes (needs ffmpeg)
+audio_pipeline = AudioPipeline()
+
+# Memoized planning responses for identical (prompt, images) inputs
+plan_cache = PlanCache(max_entries=PLAN_CACHE_MAX_ENTRIES, ttl_seconds=PLAN_CACHE_TTL_SECONDS)
+
+# Background plans started by DNA edits, keyed by session id (or the edited state)
+speculative_plans = {}
+# Single-flight keys of planning calls that a speculative plan started (unretried)
+speculative_flights = set()
 
 
 # Request/Response Models
 class FeedbackRequest(BaseModel):
-    feedback: str
-    state: dict  # LIVIN DNA state from frontend
+    feedback: str = ""  # Empty = DEFAULT_FEEDBACK
+    state: Optional[dict] = None  # LIVIN DNA state from frontend (when not using a session)
+    session_id: Optional[str] = None  # Server-side session holding the state
+    base_version: Optional[int] = None  # Session version the client last saw
     earth_location: Optional[str] = None
     mars_location: Optional[str] = None
+    fresh_plan: bool = False  # Skip the planning cache
+    preview: Optional[bool] = None  # Drafts first (defaults to PREVIEW_MODE_ENABLED)
 
 
 class DNAUpdateRequest(BaseModel):
-    state: dict
+    state: Optional[dict] = None
     updated_dna: List[str]  # User-modified DNA keywords
+    session_id: Optional[str] = None
+    base_version: Optional[int] = None
+
+
+class SessionCreateRequest(BaseModel):
+    state: Optional[dict] = None  # Seed with an existing client-side state
 
 
 # --- Helper Functions ---
 
-async def retry_with_backoff(func, *args, max_retries=3, initial_delay=2, **kwargs):
-    """Retries an async function with exponential backoff on 503 errors."""
-    delay = initial_delay
-    for i in range(max_retries):
+async def retry_with_backoff(operation: str, func, *args, key: Optional[str] = None, **kwargs):
+    """
+    Calls an upstream function under the retry policy and circuit breaker
+    for its operation ("plan", "image" or "transcribe").
+    Only errors typed as retryable (429/5xx/timeouts) are retried.
+    Calls given a single-flight key (AIClient.plan_key/image_key/images_key)
+    are coalesced around the whole retried call, so concurrent duplicates
+    reach the breaker and the retry budget once. A caller that joined a
+    speculative plan's unretried call makes its own retried call if that
+    one fails.
+    """
+    if key is None:
+        return await upstream_retry.call(operation, func, *args, **kwargs)
+    joined_speculative = key in speculative_flights
+    try:
+        return await coalesce(operation, key, upstream_retry.call, operation, func, *args, **kwargs)
+    except Exception as e:
+        if not joined_speculative:
+            raise
+        print(f"Speculative {operation} call failed ({e}), retrying on its own...")
+    return await coalesce(operation, key, upstream_retry.call, operation, func, *args, **kwargs)
+
+
+async def coalesce(operation: str, key: str, func, *args, **kwargs):
+    """
+    Runs func through the single-flight layer: callers with the same key
+    share one in-flight call. Each caller gets its own copy of the result.
+    """
+    if single_flight is None:
+        return await func(*args, **kwargs)
+    if key in single_flight:
+        metrics.UPSTREAM_COALESCED.labels(operation).inc()
+    else:
+        metrics.UPSTREAM_SINGLE_FLIGHT_CALLS.labels(operation).inc()
+    # Callers update plans in place
+    return copy.deepcopy(await single_flight.run(key, func, *args, **kwargs))
+
+
+async def cleanup_images(filename: str, size: int):
+    """
+    Registers a newly saved image and removes the oldest ones once the
+    directory exceeds MAX_IMAGE_COUNT files or MAX_IMAGE_BYTES bytes.
+    """
+    await image_index.remove(image_index.add(filename, size))
+
+
+async def build_image_derivatives(filename: str):
+    """Encode derivatives of a saved image and register them for retention."""
+    try:
+        built = await derivative_builder.build(os.path.join(IMAGE_DIR, filename))
+    except Exception as e:
+        print(f"Derivative build failed for {filename}: {e}")
+        return
+    
+    if filename not in image_index:
+        # The original was evicted while encoding
+        await image_index.remove(list(built))
+        return
+    for name, size in built.items():
+        await image_index.remove(image_index.add(name, size))
+
+
+def schedule_derivatives(filename: str):
+    """Build derivatives in the background without delaying the result."""
+    task = asyncio.create_task(build_image_derivatives(filename))
+    derivative_tasks.add(task)
+    task.add_done_callback(derivative_tasks.discard)
+
+
+def write_image_file(filepath: str, image_data: bytes):
+    """Write image bytes to disk (runs in a worker thread)."""
+    with open(filepath, "wb") as f:
+        f.write(image_data)
+
+
+def image_etag(stat_result: os.stat_result) -> str:
+    """Strong validator derived from file size and modification time."""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against an image."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
         try:
-            return await func(*args, **kwargs)
-        except Exception as e:
-            err_str = str(e).lower()
-            if "503" in err_str or "overloaded" in err_str or "unavailable" in err_str:
-                if i == max_retries - 1:
-                    raise e
-                print(f"Model overloaded, retrying in {delay}s... (Attempt {i+1}/{max_retries})")
-                await asyncio.sleep(delay)
-                delay *= 2
-            else:
-                raise e
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def new_task_record(
+    task_id: str,
+    state: dict,
+    queue_position: int = 0,
+    earth_location: Optional[str] = None,
+    mars_location: Optional[str] = None,
+    preview: bool = False,
+    session_id: Optional[str] = None
+) -> dict:
+    """Initial status record for a generation task."""
+    return {
+        "id": task_id,
+        "round": state.get("round", 0),
+        "status": "Waiting in queue...",
+        "queue_position": queue_position,
+        "earth_images": [],
+        "mars_images": [],
+        # Session tasks report a state_diff on completion instead of the full state
+        "updated_state": None if session_id else state,
+        "session_id": session_id,
+        # Kept so draft images can be re-rendered at full size later
+        "earth_location": earth_location,
+        "mars_location": mars_location,
+        "preview": preview
+    }
 
 
-async def cleanup_images():
-    """Removes oldest images if count exceeds MAX_IMAGE_COUNT."""
-    files = [os.path.join(IMAGE_DIR, f) for f in os.listdir(IMAGE_DIR) 
-             if os.path.isfile(os.path.join(IMAGE_DIR, f))]
-    if len(files) <= MAX_IMAGE_COUNT:
+async def update_task(task_id: str, event: str = "status", **fields) -> Optional[dict]:
+    """Apply fields to a task record and push them to progress subscribers."""
+    record = await active_tasks.update(task_id, fields)
+    progress_broker.publish(task_id, event, fields)
+    return record
+
+
+async def update_queue_position(task_id: str, position: int):
+    """Scheduler callback: report a task's place in the generation queue."""
+    await update_task(task_id, queue_position=position)
+
+
+# Fixed worker pool + bounded queue for generation jobs
+generation_scheduler = GenerationScheduler(
+    workers=GENERATION_WORKERS,
+    max_queue=GENERATION_QUEUE_SIZE,
+    on_position=update_queue_position
+)
+
+
+async def resolve_state(
+    state: Optional[dict],
+    session_id: Optional[str],
+    base_version: Optional[int]
+) -> dict:
+    """
+    The LIVIN DNA state a request refers to: the session's current state, or
+    the full state sent by a client that does not use sessions.
+    Responds 404 for unknown sessions and 409 when base_version is stale.
+    """
+    if session_id:
+        record = await sessions.get(session_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if base_version is not None and base_version != record["version"]:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Session state has changed (now at version {record['version']})"
+            )
+        return record["state"]
+    if state is None:
+        raise HTTPException(status_code=400, detail="Either state or session_id is required")
+    return state
+
+
+async def enqueue_generation(
+    state: dict,
+    feedback: str,
+    uploaded_images: Optional[List[str]],
+    earth_location: Optional[str],
+    mars_location: Optional[str],
+    fresh_plan: bool = False,
+    preview: Optional[bool] = None,
+    session_id: Optional[str] = None
+) -> dict:
+    """
+    Create a task record and hand the job to the generation scheduler.
+    Responds 429 with Retry-After when the queue is full.
+    """
+    task_id = str(uuid.uuid4())
+    preview = PREVIEW_MODE_ENABLED if preview is None else preview
+    feedback = feedback if feedback.strip() else DEFAULT_FEEDBACK
+    # Record must exist before a worker can pick the job up
+    await active_tasks.create(
+        task_id,
+        new_task_record(
+            task_id,
+            state,
+            queue_position=generation_scheduler.queued + 1,
+            earth_location=earth_location,
+            mars_location=mars_location,
+            preview=preview,
+            session_id=session_id
+        )
+    )
+    
+    try:
+        position = generation_scheduler.submit(
+            task_id,
+            traced_generation,
+            task_id,
+            feedback,
+            state,
+            uploaded_images,
+            earth_location,
+            mars_location,
+            fresh_plan,
+            preview,
+            session_id
+        )
+    except QueueFullError as e:
+        await active_tasks.delete(task_id)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many visions in progress, please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    if under_load():
+        # Real rounds are waiting; speculative planning goes first
+        drop_speculative_plans()
+    
+    if session_id:
+        # Nobody reads the previous round of this session any more
+        previous = session_rounds.get(session_id)
+        session_rounds[session_id] = task_id
+        if previous is not None:
+            await cancel_task(previous, "Superseded by a newer round", superseded_by=task_id)
+    
+    return {"task_id": task_id, "queue_position": position}
+
+
+async def cancel_task(task_id: str, reason: str, **fields) -> Optional[dict]:
+    """
+    Stop a queued or running generation task and mark it cancelled.
+    Cancelling the running task aborts its pending upstream calls and retry
+    waits, which frees their worker and image slots.
+    
+    Returns:
+        The task record (unchanged if it already finished or runs in another
+        worker process), or None if the task does not exist
+    """
+    record = await active_tasks.get(task_id)
+    if record is None or record["status"] in TERMINAL_EVENTS:
+        return record
+    if await generation_scheduler.cancel(task_id) is None:
+        return record
+    
+    session_id = record.get("session_id")
+    if session_id and session_rounds.get(session_id) == task_id:
+        del session_rounds[session_id]
+    metrics.TASKS.labels("cancelled").inc()
+    record = await active_tasks.update(
+        task_id, {"status": "cancelled", "error": reason, "queue_position": 0, **fields}
+    )
+    if record is not None:
+        progress_broker.publish(task_id, "cancelled", record)
+    return record
+
+
+def under_load() -> bool:
+    """True when generation jobs fill every worker or the planning circuit is not closed."""
+    breaker = upstream_retry.breakers.get("plan")
+    busy = generation_scheduler.queued + generation_scheduler.running >= generation_scheduler.workers
+    return busy or (breaker is not None and breaker.state != "closed")
+
+
+def drop_speculative_plans():
+    for task in list(speculative_plans.values()):
+        task.cancel()
+
+
+def start_speculative_plan(owner: str, state: dict):
+    """
+    After a DNA edit, plan the next round with the default feedback in the
+    background and cache it, so a following submit with empty or default
+    feedback (and no uploads) skips the planning wait. A real submit that
+    arrives mid-flight joins the same upstream call through single-flight,
+    and falls back to its own retried call if that attempt fails.
+    
+    Args:
+        owner: Session id (a newer edit replaces that session's speculation)
+        state: State the next round will plan from
+    """
+    previous = speculative_plans.pop(owner, None)
+    if previous is not None:
+        previous.cancel()
+    if under_load() or len(speculative_plans) >= SPECULATIVE_MAX_IN_FLIGHT:
+        metrics.SPECULATIVE_PLANS.labels("skipped").inc()
+        return
+    
+    prompt = prompt_engine.build_planning_prompt(feedback=DEFAULT_FEEDBACK, state=state)
+    plan_key = plan_cache.make_key(prompt, [], ai_client.plan_model)
+    if plan_key in plan_cache:
+        return
+    
+    task = asyncio.create_task(speculative_plan(plan_key, prompt, state))
+    speculative_plans[owner] = task
+    task.add_done_callback(
+        lambda _: speculative_plans.pop(owner, None) if speculative_plans.get(owner) is task else None
+    )
+
+
+async def speculative_plan(plan_key: str, prompt: str, state: dict):
+    """Run one speculative planning call; no retries, so it never spends the retry budget."""
+    flight_key = ai_client.plan_key(prompt)
+    
+    async def unretried_plan():
+        # Marked for as long as the shared call runs, even if this task is dropped
+        try:
+            return await ai_client.generate_plan(prompt=prompt, state=state)
+        finally:
+            speculative_flights.discard(flight_key)
+    
+    if single_flight is not None and flight_key not in single_flight:
+        # Only flights led by speculation; joining a real round keeps its retries
+        speculative_flights.add(flight_key)
+    try:
+        with tracing.span("speculative_plan"):
+            plan_data = await coalesce("plan", flight_key, unretried_plan)
+    except asyncio.CancelledError:
+        metrics.SPECULATIVE_PLANS.labels("dropped").inc()
+        raise
+    except Exception as e:
+        print(f"Speculative planning failed: {e}")
+        metrics.SPECULATIVE_PLANS.labels("failed").inc()
         return
+    plan_cache.put(plan_key, plan_data)
+    metrics.SPECULATIVE_PLANS.labels("completed").inc()
+
+
+async def render_image(
+    task_id: str,
+    index: int,
+    item: dict,
+    full_prompt: str,
+    size: str,
+    timings: Optional[list] = None,
+    image_data: Optional[bytes] = None,
+    batch_key: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Render one plan item at the given size and save it.
+    
+    Args:
+        full_prompt: Image prompt built by PromptEngine for this item
+        timings: Optional list that receives this render's stage timings
+        image_data: Image already produced for this item by a batched call;
+            skips the cache lookup and the upstream call
+        batch_key: Cache key of this item's output in a batched call
+            (ImageCache.make_batch_key); batched images are stored and
+            looked up under it instead of the single-item prompt key
+    
+    Returns:
+        Image entry for the task record, or None if generation failed
+    """
+    # Reuse a previous render of the exact same prompt when available
+    cache_key = image_cache.make_key(full_prompt, size, ai_client.image_model)
+    batched = image_data is not None
+    if not batched:
+        image_data = await image_cache.get(batch_key or cache_key) if IMAGE_CACHE_ENABLED else None
+    cached = not batched and image_data is not None
+    if IMAGE_CACHE_ENABLED and not batched:
+        metrics.cache_lookup("image", cached)
+    stage_timings = {"index": index, "size": size, "cached": cached, "batched": batched}
+    if timings is not None:
+        timings.append(stage_timings)
+    
+    if batched:
+        if IMAGE_CACHE_ENABLED and batch_key is not None:
+            await image_cache.put(batch_key, image_data)
+    elif not cached:
+        # Generate image with retry
+        with metrics.stage("image", stage_timings), \
+                tracing.span("generate_image", task_id=task_id, index=index, size=size):
+            image_data = await retry_with_backoff(
+                "image",
+                ai_client.generate_image,
+                prompt=full_prompt,
+                size=size,
+                key=ai_client.image_key(full_prompt, size)
+            )
+        
+        if image_data is None:
+            print(f"Warning: Image generation failed for {item['name']}")
+            return None
+        
+        if IMAGE_CACHE_ENABLED:
+            await image_cache.put(cache_key, image_data)
+    
+    # Save image
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    filename = f"{task_id}_{index}_{timestamp}.png"
+    filepath = os.path.join(IMAGE_DIR, filename)
+    with metrics.stage("image_write", stage_timings):
+        await asyncio.to_thread(write_image_file, filepath, image_data)
+    with metrics.stage("cleanup", stage_timings), tracing.span("cleanup_images", task_id=task_id):
+        await cleanup_images(filename, len(image_data))
+    schedule_derivatives(filename)
+    
+    return {
+        "index": index,
+        "name": item["name"],
+        "url": f"/api/images/{filename}",
+        "thumb_url": f"/api/images/{filename}?variant=thumb",
+        "prompt": item["prompt"],
+        "type": item["type"],
+        "environment": item["environment"],
+        "view": item.get("view", "exterior"),
+        "cached": cached,
+        "preview": size != FULL_IMAGE_SIZE
+    }
+
+
+async def stream_plan(planning_prompt: str, state: dict, uploaded_images, on_updated_state, on_items):
+    """
+    Streams the planning call, handing updated_state and newly parsed plan
+    items to the callbacks as soon as they are complete.
+    
+    Opening the stream goes through the plan retry policy. If the stream
+    breaks before any item was dispatched, the round falls back to the
+    regular planning call; if it breaks later, the round continues with the
+    items already dispatched and the task is marked plan_truncated.
+    
+    Returns:
+        The complete plan (for caching), or None if the stream was cut short
+    """
+    parser = PlanStreamParser()
+    pending_items = []
+    dispatched = 0
+    try:
+        deltas = await retry_with_backoff(
+            "plan",
+            ai_client.open_plan_stream,
+            prompt=planning_prompt,
+            state=state,
+            images=uploaded_images
+        )
+        async for delta in deltas:
+            for kind, value in parser.feed(delta):
+                if kind == "updated_state":
+                    await on_updated_state(value)
+                else:
+                    pending_items.append(value)
+            # Image prompts need the updated DNA, so hold items until it arrives
+            if parser.updated_state is not None and pending_items:
+                await on_items(pending_items)
+                dispatched += len(pending_items)
+                pending_items = []
+        
+        plan_data = parser.result()
+        if parser.updated_state is None:
+            # Response did not have the expected shape until fully parsed
+            await on_updated_state(plan_data["updated_state"])
+            await on_items(plan_data["plan"])
+        return plan_data
+    except Exception as e:
+        if dispatched:
+            print(f"Planning stream interrupted after {dispatched} items: {e}")
+            return None
+        print(f"Planning stream failed, falling back to a regular call: {e}")
+    
+    plan_data = await retry_with_backoff(
+        "plan",
+        ai_client.generate_plan,
+        prompt=planning_prompt,
+        state=state,
+        images=uploaded_images,
+        key=ai_client.plan_key(planning_prompt, uploaded_images)
+    )
+    await on_updated_state(plan_data["updated_state"])
+    await on_items(plan_data["plan"])
+    return plan_data
+
+
+async def traced_generation(task_id: str, *args):
+    """Run generate_images_task under a root span that carries the task id."""
+    with tracing.span("generation_task", task_id=task_id):
+        trace_id = tracing.current_trace_id()
+        if trace_id:
+            await update_task(task_id, trace_id=trace_id)
+        await generate_images_task(task_id, *args)
+
+
+class GenerationRound:
+    """
+    Per-task state of one generation round: the planned LIVIN DNA, the plan
+    items dispatched so far and their rendered images. Items are rendered
+    singly or in batched calls as they are dispatched, and each image is
+    published as soon as it lands.
+    """
     
-    files.sort(key=os.path.getctime)
-    num_to_delete = len(files) - MAX_IMAGE_COUNT
-    for i in range(num_to_delete):
+    def __init__(
+        self,
+        task_id: str,
+        feedback: str,
+        state: dict,
+        size: str,
+        timings: dict,
+        earth_location: Optional[str] = None,
+        mars_location: Optional[str] = None,
+        session_id: Optional[str] = None,
+        plan_cached: bool = False
+    ):
+        self.task_id = task_id
+        self.feedback = feedback
+        self.state = state
+        self.size = size  # Small drafts in preview mode
+        self.timings = timings
+        self.earth_location = earth_location
+        self.mars_location = mars_location
+        self.session_id = session_id
+        self.plan_cached = plan_cached
+        # LIVIN DNA for image prompts, known once updated_state is planned
+        self.final_state = None
+        self.livin_dna = []
+        self.round_num = 1
+        self.items = []
+        self.prompts = []
+        self.results = []
+        self.tasks = []
+        self.completed = 0
+        self.failed = 0
+        self.last_error = None
+        # Set when a streamed plan broke off after some items were dispatched
+        self.plan_error = None
+        # Multi-output image calls, and batchable item indexes by group until started
+        self.batching = {"calls": 0, "items": 0, "fallbacks": 0}
+        self.pending = {}
+    
+    async def on_updated_state(self, updated_state: dict):
+        """Record the planned state and report it on the task."""
+        # The planner sees only recent history; keep the full record here
+        self.final_state = prompt_engine.merge_feedback_history(self.state, self.feedback, updated_state)
+        self.livin_dna = self.final_state.get("livin_dna", [])
+        self.round_num = self.final_state.get("round", 1)
+        fields = {} if self.session_id else {"updated_state": self.final_state}
+        await update_task(
+            self.task_id,
+            status="Generating Earth & Mars visions...",
+            round=self.round_num,
+            livin_dna=self.livin_dna,
+            plan_cached=self.plan_cached,
+            **fields
+        )
+    
+    async def dispatch(self, items: List[dict]):
+        """
+        Start rendering newly planned items. With batching, items sharing a
+        template are held until their group is complete (see start_batches),
+        so streamed items still batch.
+        """
+        self.prompts.extend(prompt_engine.build_image_prompts(
+            items, self.round_num, self.livin_dna, self.earth_location, self.mars_location
+        ))
+        for item in items:
+            index = len(self.items)
+            self.items.append(item)
+            self.results.append(None)
+            cache_key = image_cache.make_key(self.prompts[index], self.size, ai_client.image_model)
+            if IMAGE_BATCHING_ENABLED and not (IMAGE_CACHE_ENABLED and cache_key in image_cache):
+                # The planner writes the Earth group before the Mars one
+                self.start_batches(keep=item["environment"])
+                self.pending.setdefault(prompt_engine.image_group(item), []).append(index)
+            else:
+                self.tasks.append(asyncio.create_task(self.run_image(index)))
+        await update_task(self.task_id, images_total=len(self.results))
+    
+    def start_batches(self, keep: Optional[str] = None):
+        """
+        Start the held groups as batched calls (single calls for one-item groups).
+        
+        Args:
+            keep: Environment whose groups may still grow; None once planning has ended
+        """
+        for group in list(self.pending):
+            indexes = self.pending[group]
+            if keep and self.items[indexes[0]]["environment"] == keep:
+                continue
+            del self.pending[group]
+            if len(indexes) > 1:
+                self.tasks.append(asyncio.create_task(self.run_batch(indexes)))
+            else:
+                self.tasks.append(asyncio.create_task(self.run_image(indexes[0])))
+    
+    async def render(
+        self,
+        index: int,
+        size: Optional[str] = None,
+        image_data: Optional[bytes] = None,
+        batch_key: Optional[str] = None
+    ) -> Optional[dict]:
+        """Render item index (at the round's size unless given) through render_image."""
+        item = self.items[index]
+        with tracing.span("generate_single_image", task_id=self.task_id, index=index,
+                          item=item.get("name"), environment=item.get("environment")):
+            return await render_image(
+                self.task_id, index, item, self.prompts[index], size or self.size,
+                self.timings["images"], image_data, batch_key
+            )
+    
+    def publish(self, **fields):
+        """Push the images finished so far to the task record."""
+        # Keep Earth and Mars groups in plan order
+        return update_task(
+            self.task_id,
+            event="image",
+            earth_images=[r for r in self.results if r and r["environment"] == "earth"],
+            mars_images=[r for r in self.results if r and r["environment"] == "mars"],
+            **fields
+        )
+    
+    async def run_image(self, index: int, image_data: Optional[bytes] = None, batch_key: Optional[str] = None):
+        """Render one item and count it as completed or failed."""
         try:
-            os.remove(files[i])
+            result = await self.render(index, image_data=image_data, batch_key=batch_key)
         except Exception as e:
-            print(f"Error deleting {files[i]}: {e}")
+            print(f"Warning: Image generation failed for {self.items[index]['name']}: {e}")
+            result = None
+            self.last_error = e
+        
+        if result is None:
+            self.failed += 1
+            metrics.IMAGE_FAILURES.inc()
+            await update_task(self.task_id, images_failed=self.failed)
+            return
+        
+        self.completed += 1
+        self.results[index] = result
+        await self.publish(images_completed=self.completed)
+    
+    async def run_batch(self, indexes: List[int]):
+        """One upstream call for items sharing a base template; missing outputs fall back to per-item calls."""
+        items = [self.items[index] for index in indexes]
+        prompt = prompt_engine.build_batch_image_prompt(
+            items, self.round_num, self.livin_dna, self.earth_location, self.mars_location
+        )
+        keys = [
+            image_cache.make_batch_key(prompt, len(items), position, self.size, ai_client.image_model)
+            for position in range(len(items))
+        ]
+        if IMAGE_CACHE_ENABLED and all(key in image_cache for key in keys):
+            # The same batch was rendered before
+            await asyncio.gather(*[
+                self.run_image(index, batch_key=key) for index, key in zip(indexes, keys)
+            ])
+            return
+        images = []
+        try:
+            with tracing.span("generate_image_batch", task_id=self.task_id, items=len(items)):
+                images = await retry_with_backoff(
+                    "image", ai_client.generate_images, prompt=prompt, n=len(items), size=self.size,
+                    key=ai_client.images_key(prompt, len(items), self.size)
+                )
+        except Exception as e:
+            print(f"Warning: Batched image call failed, falling back to single calls: {e}")
+        self.batching["calls"] += 1
+        self.batching["items"] += min(len(images), len(items))
+        self.batching["fallbacks"] += max(0, len(items) - len(images))
+        await asyncio.gather(*[
+            self.run_image(index, images[i], keys[i]) if i < len(images) else self.run_image(index)
+            for i, index in enumerate(indexes)
+        ])
+    
+    async def upgrade(self):
+        """Re-render every finished draft at full size."""
+        self.tasks = [
+            asyncio.create_task(self.upgrade_image(index))
+            for index, result in enumerate(self.results)
+            if result is not None
+        ]
+        await asyncio.gather(*self.tasks)
+    
+    async def upgrade_image(self, index: int):
+        try:
+            result = await self.render(index, size=FULL_IMAGE_SIZE)
+        except Exception as e:
+            print(f"Warning: Full render failed for {self.items[index]['name']}, keeping draft: {e}")
+            return
+        if result is not None:
+            self.results[index] = result
+            await self.publish()
+    
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+    
+    def batching_summary(self) -> Optional[dict]:
+        """Upstream calls avoided by rendering several items per call, or None without batched calls."""
+        batching = self.batching
+        if not batching["calls"]:
+            return None
+        saved = batching["items"] - batching["calls"]
+        metrics.IMAGE_BATCH_CALLS_SAVED.inc(max(0, saved))
+        print(f"Task {self.task_id}: {batching['calls']} batched image calls covered "
+              f"{batching['items']} images ({saved} calls saved, {batching['fallbacks']} fallbacks)")
+        return dict(batching, calls_saved=saved)
 
 
-def encode_image_to_base64(image_data: bytes) -> str:
-    """Encode image bytes to base64 string."""
-    return base64.b64encode(image_data).decode('utf-8')
+async def plan_round(
+    generation: GenerationRound,
+    planning_prompt: str,
+    plan_key: str,
+    plan_data: Optional[dict],
+    uploaded_images: Optional[List[str]]
+):
+    """
+    Plan the round (unless plan_data came from the cache) and dispatch its
+    items; with plan streaming, items are dispatched as they are parsed.
+    """
+    task_id = generation.task_id
+    timings = generation.timings
+    if plan_data is None and PLAN_STREAMING_ENABLED:
+        # Render each plan item while the model is still writing the rest
+        with metrics.stage("plan", timings), \
+                tracing.span("generate_plan", task_id=task_id, streamed=True):
+            plan_data = await stream_plan(
+                planning_prompt, generation.state, uploaded_images,
+                generation.on_updated_state, generation.dispatch
+            )
+        generation.start_batches()
+        if plan_data is None:
+            # Not cached, and the task reports the missing items
+            generation.plan_error = f"Planning was cut short after {len(generation.items)} items"
+        else:
+            plan_cache.put(plan_key, plan_data)
+        return
+    
+    if plan_data is None:
+        with metrics.stage("plan", timings), \
+                tracing.span("generate_plan", task_id=task_id, streamed=False):
+            plan_data = await retry_with_backoff(
+                "plan",
+                ai_client.generate_plan,
+                prompt=planning_prompt,
+                state=generation.state,
+                images=uploaded_images,
+                key=ai_client.plan_key(planning_prompt, uploaded_images)
+            )
+        plan_cache.put(plan_key, plan_data)
+    await generation.on_updated_state(plan_data["updated_state"])
+    await generation.dispatch(plan_data["plan"])
+    generation.start_batches()
 
 
 async def generate_images_task(
     task_id: str, 
     feedback: str, 
     state: dict,
-    uploaded_images: List[str] = None,  # Base64 encoded images
+    uploaded_images: List[str] = None,  # Prepared upload file paths
     earth_location: str = None,
-    mars_location: str = None
+    mars_location: str = None,
+    fresh_plan: bool = False,
+    preview: bool = False,
+    session_id: Optional[str] = None
 ):
-    """Background task for generating LIVIN images."""
-    active_tasks[task_id]["status"] = "Analyzing your vision..."
+    """
+    Background task for generating LIVIN images.
+    In preview mode every item is first rendered as a small draft; drafts
+    are upgraded to full size afterwards when PREVIEW_AUTO_UPGRADE is set,
+    otherwise on request through /api/tasks/{task_id}/upgrade/{index}.
+    """
+    await update_task(task_id, status="Analyzing your vision...")
+    
+    # Per-stage seconds, also stored on the task record
+    timings = {"images": []}
+    task_started = time.perf_counter()
+    
+    def finish_timings() -> dict:
+        timings["total"] = round(time.perf_counter() - task_started, 4)
+        return timings
     
     try:
         # 1. Build planning prompt
@@ -111,233 +941,503 @@ async def generate_images_task(
         if uploaded_images:
             images_desc = f"{len(uploaded_images)} reference/sketch images provided by user"
         
-        planning_prompt = prompt_engine.build_planning_prompt(
-            feedback=feedback,
-            state=state,
-            user_images_description=images_desc
-        )
-        
-        # 2. Call AI to generate plan
-        active_tasks[task_id]["status"] = "Evolving your LIVIN DNA..."
-        plan_data = await retry_with_backoff(
-            ai_client.generate_plan,
-            prompt=planning_prompt,
-            state=state,
-            images=uploaded_images
-        )
+        with metrics.stage("planning_prompt", timings), \
+                tracing.span("build_planning_prompt", task_id=task_id):
+            planning_prompt = prompt_engine.build_planning_prompt(
+                feedback=feedback,
+                state=state,
+                user_images_description=images_desc
+            )
         
-        active_tasks[task_id]["status"] = "Generating Earth & Mars visions..."
-        active_tasks[task_id]["updated_state"] = plan_data["updated_state"]
-        active_tasks[task_id]["round"] = plan_data["updated_state"].get("round", 1)
+        # 2. Call AI to generate plan (or reuse one for identical inputs)
+        await update_task(task_id, status="Evolving your LIVIN DNA...")
+        image_digests = [upload_digest(path) for path in uploaded_images or []]
+        plan_key = plan_cache.make_key(planning_prompt, image_digests, ai_client.plan_model)
+        plan_data = None if fresh_plan else plan_cache.get(plan_key)
+        if not fresh_plan:
+            metrics.cache_lookup("plan", plan_data is not None)
         
-        # 3. Get LIVIN DNA for image prompts
-        livin_dna = plan_data["updated_state"].get("livin_dna", [])
-        current_round = plan_data["updated_state"].get("round", 1)
+        # 3. Generate images in parallel (small drafts first in preview mode)
+        generation = GenerationRound(
+            task_id,
+            feedback,
+            state,
+            PREVIEW_IMAGE_SIZE if preview else FULL_IMAGE_SIZE,
+            timings,
+            earth_location=earth_location,
+            mars_location=mars_location,
+            session_id=session_id,
+            plan_cached=plan_data is not None
+        )
         
-        # 4. Generate images in parallel
-        async def generate_single_image(index: int, item: dict):
-            # Build full image prompt
-            full_prompt = prompt_engine.build_image_prompt(
-                design_prompt=item["prompt"],
-                environment=item["environment"],
-                view=item.get("view", "exterior"),
-                round_num=current_round,
-                livin_dna=livin_dna,
-                location_description=earth_location if item["environment"] == "earth" else mars_location
-            )
-            
-            # Generate image with retry
-            image_data = await retry_with_backoff(
-                ai_client.generate_image,
-                prompt=full_prompt,
-                size="1536x1024"
-            )
-            
-            if image_data is None:
-                print(f"Warning: Image generation failed for {item['name']}")
-                return None
-            
-            # Save image
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            filename = f"{task_id}_{index}_{timestamp}.png"
-            filepath = os.path.join(IMAGE_DIR, filename)
-            with open(filepath, "wb") as f:
-                f.write(image_data)
+        await update_task(task_id, images_total=0, images_completed=0, images_failed=0, partial=True)
+        try:
+            await plan_round(generation, planning_prompt, plan_key, plan_data, uploaded_images)
+            await asyncio.gather(*generation.tasks)
             
-            return {
-                "name": item["name"],
-                "url": f"/api/images/{filename}",
-                "prompt": item["prompt"],
-                "type": item["type"],
-                "environment": item["environment"],
-                "view": item.get("view", "exterior")
-            }
-        
-        # Generate all 6 images concurrently
-        tasks = [generate_single_image(i, item) for i, item in enumerate(plan_data["plan"])]
-        results = await asyncio.gather(*tasks)
+            if preview and PREVIEW_AUTO_UPGRADE and generation.completed:
+                await update_task(task_id, status="Refining visions to full resolution...")
+                await generation.upgrade()
+        finally:
+            generation.cancel()
         
-        # Separate into Earth and Mars groups
-        earth_images = [r for r in results if r and r["environment"] == "earth"]
-        mars_images = [r for r in results if r and r["environment"] == "mars"]
+        if generation.completed == 0 and generation.last_error is not None:
+            raise generation.last_error
         
-        active_tasks[task_id]["earth_images"] = earth_images
-        active_tasks[task_id]["mars_images"] = mars_images
-        active_tasks[task_id]["status"] = "completed"
-        
-        await cleanup_images()
+        fields = {"partial": False, "status": "completed", "timings": finish_timings()}
+        batching = generation.batching_summary()
+        if batching is not None:
+            fields["image_batching"] = batching
+        if generation.plan_error:
+            fields.update(plan_truncated=True, error=generation.plan_error)
+        metrics.TASKS.labels("partial" if generation.failed or generation.plan_error else "completed").inc()
+        if session_id and generation.final_state is not None:
+            # Advance the session and send clients only what changed
+            saved = await sessions.replace(session_id, generation.final_state)
+            if saved is not None:
+                session, diff = saved
+                fields.update(state_diff=diff, session_version=session["version"])
+        record = await active_tasks.update(task_id, fields)
+        if record is not None:
+            progress_broker.publish(task_id, "completed", record)
         
     except Exception as e:
         print(f"Error in generation task: {e}")
-        active_tasks[task_id]["status"] = "failed"
-        active_tasks[task_id]["error"] = str(e)
+        metrics.TASKS.labels("failed").inc()
+        record = await active_tasks.update(
+            task_id, {"status": "failed", "error": str(e), "timings": finish_timings()}
+        )
+        if record is not None:
+            progress_broker.publish(task_id, "failed", record)
+    finally:
+        if session_id and session_rounds.get(session_id) == task_id:
+            del session_rounds[session_id]
 
 
 # --- API Endpoints ---
 
 @app.post("/api/feedback")
 async def handle_feedback(
-    background_tasks: BackgroundTasks,
-    feedback: str = Form(...),
-    state: str = Form(...),  # JSON string
+    feedback: str = Form(""),
+    state: Optional[str] = Form(None),  # JSON string (when not using a session)
+    session_id: Optional[str] = Form(None),
+    base_version: Optional[int] = Form(None),
     earth_location: Optional[str] = Form(None),
     mars_location: Optional[str] = Form(None),
     reference_images: List[UploadFile] = File(default=[]),
     environment_image: Optional[UploadFile] = File(None),
-    sketch_image: Optional[UploadFile] = File(None)
+    sketch_image: Optional[UploadFile] = File(None),
+    fresh_plan: bool = Form(False),
+    preview: Optional[bool] = Form(None)
 ):
     """
     Handle user feedback and uploaded images.
-    Triggers background generation of Earth and Mars visions.
+    Queues background generation of Earth and Mars visions.
+    Set fresh_plan to bypass the planning cache for identical inputs, and
+    preview to get fast low-resolution drafts first.
     """
-    # Parse state JSON
-    try:
-        state_dict = json.loads(state)
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid state JSON")
-    
-    # Process uploaded images
-    uploaded_images = []
-    
-    for ref_img in reference_images:
-        img_data = await ref_img.read()
-        uploaded_images.append(encode_image_to_base64(img_data))
+    # Parse state JSON, or take it from the session
+    state_dict = None
+    if state is not None and not session_id:
+        try:
+            state_dict = json.loads(state)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid state JSON")
+    state_dict = await resolve_state(state_dict, session_id, base_version)
     
+    # Spool, downscale and deduplicate uploaded images (encoded later, right before upstream)
+    uploads = list(reference_images)
     if environment_image:
-        img_data = await environment_image.read()
-        uploaded_images.append(encode_image_to_base64(img_data))
-    
+        uploads.append(environment_image)
     if sketch_image:
-        img_data = await sketch_image.read()
-        uploaded_images.append(encode_image_to_base64(img_data))
+        uploads.append(sketch_image)
     
-    # Create task
-    task_id = str(uuid.uuid4())
-    active_tasks[task_id] = {
-        "id": task_id,
-        "round": state_dict.get("round", 0),
-        "status": "Initializing...",
-        "earth_images": [],
-        "mars_images": [],
-        "updated_state": state_dict
-    }
+    uploaded_images = await upload_processor.prepare(
+        [upload.file for upload in uploads],
+        [upload.content_type for upload in uploads]
+    )
     
-    # Start background task
-    background_tasks.add_task(
-        generate_images_task,
-        task_id,
-        feedback,
+    # Create task and queue it
+    return await enqueue_generation(
         state_dict,
+        feedback,
         uploaded_images if uploaded_images else None,
         earth_location,
-        mars_location
+        mars_location,
+        fresh_plan,
+        preview,
+        session_id
     )
-    
-    return {"task_id": task_id}
 
 
 @app.post("/api/feedback/simple")
-async def handle_simple_feedback(req: FeedbackRequest, background_tasks: BackgroundTasks):
+async def handle_simple_feedback(req: FeedbackRequest):
     """
     Simple feedback endpoint without file uploads.
     For text/voice only input.
     """
-    task_id = str(uuid.uuid4())
-    active_tasks[task_id] = {
-        "id": task_id,
-        "round": req.state.get("round", 0),
-        "status": "Initializing...",
-        "earth_images": [],
-        "mars_images": [],
-        "updated_state": req.state
-    }
-    
-    background_tasks.add_task(
-        generate_images_task,
-        task_id,
+    state = await resolve_state(req.state, req.session_id, req.base_version)
+    return await enqueue_generation(
+        state,
         req.feedback,
-        req.state,
         None,
         req.earth_location,
-        req.mars_location
+        req.mars_location,
+        req.fresh_plan,
+        req.preview,
+        req.session_id
     )
-    
-    return {"task_id": task_id}
 
 
 @app.get("/api/status/{task_id}")
 async def get_status(task_id: str):
-    """Get the status of a generation task."""
-    if task_id not in active_tasks:
+    """Get the status of a generation task (polling fallback for /api/events)."""
+    record = await active_tasks.get(task_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    return active_tasks[task_id]
+    return record
+
+
+@app.get("/api/events/{task_id}")
+async def stream_task_events(task_id: str, request: Request):
+    """
+    Stream task progress as Server-Sent Events.
+    Sends a snapshot first, then status changes and per-image completions
+    until the task completes or fails. /api/status remains as a polling fallback.
+    
+    Tasks running in another worker process publish nothing here, so when the
+    local stream is quiet the shared task store is re-read and any change is
+    sent as a fresh snapshot.
+    """
+    if await active_tasks.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    async def event_stream():
+        queue = progress_broker.subscribe(task_id)
+        try:
+            snapshot = await active_tasks.get(task_id)
+            if snapshot is None:
+                return
+            yield format_sse("snapshot", snapshot)
+            if snapshot["status"] in TERMINAL_EVENTS:
+                return
+            
+            loop = asyncio.get_running_loop()
+            last_sent = loop.time()
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=SSE_STORE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    record = await active_tasks.get(task_id)
+                    if record is None:
+                        return
+                    if record != snapshot:
+                        snapshot = record
+                        last_sent = loop.time()
+                        status = record["status"]
+                        yield format_sse(status if status in TERMINAL_EVENTS else "snapshot", record)
+                        if status in TERMINAL_EVENTS:
+                            return
+                    elif loop.time() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                        last_sent = loop.time()
+                        yield ": keep-alive\n\n"
+                    continue
+                
+                last_sent = loop.time()
+                yield format_sse(event, data)
+                if event in TERMINAL_EVENTS:
+                    return
+        finally:
+            progress_broker.unsubscribe(task_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def upgrade_image(task_id: str, index: int) -> dict:
+    """Render a preview draft at full size and swap it into the task record."""
+    record = await active_tasks.get(task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if record["status"] != "completed":
+        raise HTTPException(status_code=409, detail="Task is still generating")
+    
+    image = next(
+        (img for img in record["earth_images"] + record["mars_images"] if img["index"] == index),
+        None
+    )
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not image.get("preview"):
+        return image
+    
+    full_prompt = prompt_engine.build_image_prompt(
+        design_prompt=image["prompt"],
+        environment=image["environment"],
+        view=image.get("view", "exterior"),
+        round_num=record["round"],
+        livin_dna=record.get("livin_dna", []),
+        location_description=record.get(f"{image['environment']}_location")
+    )
+    result = await render_image(task_id, index, image, full_prompt, FULL_IMAGE_SIZE)
+    if result is None:
+        raise HTTPException(status_code=502, detail="Full render failed")
+    
+    # Re-read under the lock so concurrent upgrades of other images are kept
+    async with upgrade_record_lock:
+        record = await active_tasks.get(task_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        group = f"{result['environment']}_images"
+        images = [result if img["index"] == index else img for img in record[group]]
+        await update_task(task_id, event="image", **{group: images})
+    return result
+
+
+@app.post("/api/tasks/{task_id}/cancel")
+async def cancel_generation(task_id: str):
+    """
+    Cancel a queued or running round. Images finished so far stay on the
+    task record; finished tasks are returned unchanged.
+    """
+    record = await cancel_task(task_id, "Cancelled by user")
+    if record is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if record["status"] not in TERMINAL_EVENTS:
+        raise HTTPException(status_code=409, detail="Task is not running in this worker process")
+    return record
+
+
+@app.post("/api/tasks/{task_id}/upgrade/{index}")
+async def upgrade_task_image(task_id: str, index: int):
+    """
+    Upgrade one preview draft of a completed task to full resolution.
+    Repeated clicks on the same draft share one render.
+    
+    Returns:
+        The updated image entry
+    """
+    key = (task_id, index)
+    task = image_upgrades.get(key)
+    if task is None:
+        task = asyncio.create_task(upgrade_image(task_id, index))
+        image_upgrades[key] = task
+        task.add_done_callback(lambda _: image_upgrades.pop(key, None))
+    try:
+        return await asyncio.shield(task)
+    except UpstreamError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
 @app.get("/api/images/{filename}")
-async def get_image(filename: str):
-    """Serve generated images."""
-    filepath = os.path.join(IMAGE_DIR, filename)
-    if not os.path.exists(filepath):
+async def get_image(filename: str, request: Request, variant: Optional[str] = None):
+    """
+    Serve generated images.
+    
+    variant selects "thumb", "webp", "avif" or "original". Without it, the
+    smallest derivative the client's Accept header allows is served, falling
+    back to the original PNG until derivatives have been built.
+    Responses carry ETag/Last-Modified and an immutable Cache-Control,
+    and conditional requests are answered with 304.
+    """
+    if os.path.basename(filename) != filename:
         raise HTTPException(status_code=404, detail="Image not found")
-    return FileResponse(filepath)
+    if variant is not None and variant != "original" and variant not in VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Unknown image variant: {variant}")
+    
+    negotiate = variant is None and filename.endswith(".png")
+    if negotiate:
+        accept = request.headers.get("accept", "")
+        candidates = [v for v in ("avif", "webp") if VARIANTS[v][1] in accept]
+    elif variant in VARIANTS:
+        candidates = [variant]
+    else:
+        candidates = []
+    
+    names = [variant_filename(filename, v) for v in candidates] + [filename]
+    media_types = [VARIANTS[v][1] for v in candidates] + [None]
+    for name, media_type in zip(names, media_types):
+        filepath = os.path.join(IMAGE_DIR, name)
+        try:
+            stat_result = await asyncio.to_thread(os.stat, filepath)
+            break
+        except FileNotFoundError:
+            continue
+    else:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = image_etag(stat_result)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": IMAGE_CACHE_CONTROL
+    }
+    if negotiate:
+        headers["Vary"] = "Accept"
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(filepath, headers=headers, media_type=media_type, stat_result=stat_result)
+
+
+async def prepare_audio(audio_file: UploadFile) -> List[AudioChunk]:
+    """Trim, resample and chunk an uploaded recording (streamed from its spool file)."""
+    with metrics.stage("audio_preprocess"), tracing.span("prepare_audio"):
+        return await audio_pipeline.prepare(
+            audio_file.file,
+            audio_file.filename or "audio.webm",
+            audio_file.content_type or "audio/webm"
+        )
+
+
+def transcription_events(chunks: List[AudioChunk]):
+    """Transcribe chunks concurrently; yields ("partial" | "completed", data)."""
+    async def transcribe(chunk: AudioChunk) -> dict:
+        with metrics.stage("transcribe_chunk"), tracing.span("transcribe_chunk", index=chunk.index):
+            return await retry_with_backoff(
+                "transcribe",
+                ai_client.transcribe_audio,
+                chunk.data,
+                filename=chunk.filename,
+                content_type=chunk.content_type
+            )
+    return transcribe_chunks(chunks, transcribe, TRANSCRIBE_CONCURRENCY)
 
 
 @app.post("/api/transcribe")
 async def transcribe_audio(audio_file: UploadFile = File(...)):
     """Transcribe audio using AI Builder Space API."""
     try:
-        audio_data = await audio_file.read()
-        result = await ai_client.transcribe_audio(audio_data)
-        
-        return {
-            "text": result.get("text", ""),
-            "language": result.get("detected_language"),
-            "confidence": result.get("confidence")
-        }
+        chunks = await prepare_audio(audio_file)
+        result = None
+        async for _, result in transcription_events(chunks):
+            pass  # The last event is "completed"
+        return result
+    except UpstreamError as e:
+        if isinstance(e, CircuitOpenError) or e.retryable:
+            headers = {"Retry-After": str(int(e.retry_after or 5))}
+            raise HTTPException(status_code=503, detail=str(e), headers=headers)
+        raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
 
 
+@app.post("/api/transcribe/stream")
+async def transcribe_audio_stream(audio_file: UploadFile = File(...)):
+    """
+    Transcribe audio as Server-Sent Events: a "partial" event with the text
+    so far each time a chunk finishes, then "completed" ({text, language,
+    confidence}) or "failed" ({detail, retry_after}).
+    """
+    # Read the upload before responding; it is closed once the handler returns
+    chunks = await prepare_audio(audio_file)
+    
+    async def event_stream():
+        try:
+            async for event, data in transcription_events(chunks):
+                yield format_sse(event, data)
+        except UpstreamError as e:
+            retry_after = int(e.retry_after or 5) if isinstance(e, CircuitOpenError) or e.retryable else None
+            yield format_sse("failed", {"detail": f"Transcription failed: {str(e)}", "retry_after": retry_after})
+        except Exception as e:
+            yield format_sse("failed", {"detail": f"Transcription failed: {str(e)}", "retry_after": None})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/api/dna/update")
 async def update_dna(req: DNAUpdateRequest):
     """
     Update LIVIN DNA based on user's manual edits.
     Allows users to select/unselect/modify DNA keywords.
+    With a session_id the edit is applied to the session in place and only
+    the diff is returned; base_version guards against overwriting newer state.
     """
+    updated_dna = req.updated_dna[:8]  # Ensure max 8 keywords
+    if req.session_id:
+        try:
+            saved = await sessions.update(req.session_id, {"livin_dna": updated_dna}, req.base_version)
+        except VersionConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if saved is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        session, diff = saved
+        if SPECULATIVE_PLANNING_ENABLED:
+            start_speculative_plan(session["id"], session["state"])
+        return {"session_id": session["id"], "version": session["version"], "state_diff": diff}
+    
+    if req.state is None:
+        raise HTTPException(status_code=400, detail="Either state or session_id is required")
     updated_state = req.state.copy()
-    updated_state["livin_dna"] = req.updated_dna[:8]  # Ensure max 8 keywords
+    updated_state["livin_dna"] = updated_dna
+    if SPECULATIVE_PLANNING_ENABLED:
+        start_speculative_plan(json.dumps(updated_state, sort_keys=True), updated_state)
     return {"updated_state": updated_state}
 
 
+@app.post("/api/sessions")
+async def create_session(req: Optional[SessionCreateRequest] = None):
+    """Start a server-side session, optionally seeded with a client's current state."""
+    record = await sessions.create(req.state if req else None)
+    return {"session_id": record["id"], "version": record["version"], "state": record["state"]}
+
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Full current state of a session (used to resync after a conflict)."""
+    record = await sessions.get(session_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": record["id"], "version": record["version"], "state": record["state"]}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: stage timings, upstream retries/errors, caches and queue gauges."""
+    metrics.ACTIVE_TASKS.set(await active_tasks.count())
+    metrics.QUEUED_TASKS.set(generation_scheduler.queued)
+    metrics.RUNNING_TASKS.set(generation_scheduler.running)
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 # Serve Frontend (Must be after API routes)
 if os.path.exists(STATIC_DIR) and os.listdir(STATIC_DIR):
     app.mount("/", StaticFiles(directory=STATIC_DIR, html=True), name="frontend")
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Start the generation worker pool and index stored and cached images."""
+    tracing.setup_tracing()
+    await generation_scheduler.start()
+    await image_index.load()
+    await image_cache.load()
+    await upload_processor.load()
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Clean up AI client on shutdown."""
+    """Clean up workers, AI client and task store on shutdown."""
+    drop_speculative_plans()
+    await generation_scheduler.stop()
+    derivative_builder.close()
+    if ai_client.image_hedger is not None:
+        print(f"Image hedging stats: {ai_client.image_hedger.stats()}")
+    if single_flight is not None:
+        print(f"Single-flight stats: {single_flight.stats()}")
     await ai_client.close()
+    await active_tasks.close()
+    await sessions.store.close()
+    tracing.shutdown_tracing()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,215 @@
+"""
+Load-test benchmark for Dream LIVIN Shop.
+
+Drives full rounds against a running server: POST /api/feedback, poll
+/api/status until the task finishes, then GET every image. Reports
+p50/p95/p99 latency per step, rounds per second and server RSS.
+
+Run the server against the local mock upstream so no tokens are spent:
+    python scripts/mock_upstream.py --port 9100 &
+    AI_BUILDER_BASE_URL=http://localhost:9100/v1 AI_BUILDER_TOKEN=mock python main.py &
+    python scripts/benchmark.py --rounds 60 --concurrency 12 --server-pid $!
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+import httpx
+
+
+DEFAULT_STATE = {
+    "round": 0,
+    "design_summary": "",
+    "livin_dna": [],
+    "confirmed_preferences": [],
+    "rejected_elements": [],
+    "feedback_history": []
+}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB (Linux /proc, or psutil if installed)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.samples: Dict[str, List[float]] = {"submit": [], "status": [], "image": [], "round": []}
+        self.outcomes: Dict[str, int] = {}
+        self.rss: List[float] = []
+        self._done = asyncio.Event()
+
+    def count(self, outcome: str):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    async def timed(self, name: str, request):
+        started = time.perf_counter()
+        response = await request
+        self.samples[name].append(time.perf_counter() - started)
+        return response
+
+    async def run_round(self, client: httpx.AsyncClient, n: int):
+        args = self.args
+        state = dict(DEFAULT_STATE, round=n % 5)
+        started = time.perf_counter()
+        response = await self.timed("submit", client.post("/api/feedback", data={
+            "feedback": f"{args.feedback} (benchmark round {n})",
+            "state": json.dumps(state),
+            "fresh_plan": "true" if args.fresh_plan else "false"
+        }))
+        if response.status_code != 200:
+            self.count(f"submit_{response.status_code}")
+            return
+        task_id = response.json()["task_id"]
+
+        deadline = started + args.timeout
+        record = None
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(args.poll_interval)
+            response = await self.timed("status", client.get(f"/api/status/{task_id}"))
+            if response.status_code != 200:
+                self.count(f"status_{response.status_code}")
+                return
+            record = response.json()
+            if record["status"] in ("completed", "failed"):
+                break
+        else:
+            self.count("timeout")
+            return
+
+        if record["status"] == "failed":
+            self.count("failed")
+            return
+
+        images = record.get("earth_images", []) + record.get("mars_images", [])
+        for image in images:
+            response = await self.timed("image", client.get(image["url"]))
+            if response.status_code != 200:
+                self.count(f"image_{response.status_code}")
+        self.samples["round"].append(time.perf_counter() - started)
+        self.count("completed" if len(images) == 6 else "partial")
+
+    async def sample_rss(self):
+        while not self._done.is_set():
+            rss = read_rss_mb(self.args.server_pid)
+            if rss is not None:
+                self.rss.append(rss)
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> dict:
+        args = self.args
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+            sampler = asyncio.create_task(self.sample_rss()) if args.server_pid else None
+            queue = asyncio.Queue()
+            for n in range(args.rounds):
+                queue.put_nowait(n)
+
+            async def worker():
+                while True:
+                    try:
+                        n = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    try:
+                        await self.run_round(client, n)
+                    except httpx.HTTPError as e:
+                        self.count(f"error_{type(e).__name__}")
+
+            started = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+            elapsed = time.perf_counter() - started
+            self._done.set()
+            if sampler:
+                await sampler
+
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        latency = {}
+        for name, values in self.samples.items():
+            latency[name] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99)
+            }
+        return {
+            "rounds": self.args.rounds,
+            "concurrency": self.args.concurrency,
+            "elapsed_seconds": elapsed,
+            "rounds_per_second": len(self.samples["round"]) / elapsed if elapsed else 0.0,
+            "outcomes": self.outcomes,
+            "latency_seconds": latency,
+            "rss_mb": {
+                "start": self.rss[0] if self.rss else None,
+                "peak": max(self.rss) if self.rss else None,
+                "end": self.rss[-1] if self.rss else None
+            }
+        }
+
+
+def print_report(report: dict):
+    def fmt(value, unit="s"):
+        return "-" if value is None else f"{value:.3f}{unit}"
+
+    print(f"\nRounds: {report['rounds']}  concurrency: {report['concurrency']}  "
+          f"elapsed: {report['elapsed_seconds']:.1f}s  rounds/s: {report['rounds_per_second']:.3f}")
+    print(f"Outcomes: {report['outcomes']}")
+    print(f"\n{'step':<8} {'count':>6} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for name, stats in report["latency_seconds"].items():
+        print(f"{name:<8} {stats['count']:>6} {fmt(stats['p50']):>10} {fmt(stats['p95']):>10} {fmt(stats['p99']):>10}")
+    rss = report["rss_mb"]
+    if rss["peak"] is not None:
+        print(f"\nServer RSS: start {fmt(rss['start'], ' MB')}  peak {fmt(rss['peak'], ' MB')}  end {fmt(rss['end'], ' MB')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dream LIVIN Shop load-test benchmark")
+    parser.add_argument("--url", default=os.getenv("BENCHMARK_URL", "http://localhost:8003"))
+    parser.add_argument("--rounds", type=int, default=30, help="Total rounds to run")
+    parser.add_argument("--concurrency", type=int, default=6, help="Rounds in flight at once")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between status polls")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-round timeout (s)")
+    parser.add_argument("--feedback", default="A bright modular cabin with timber and glass")
+    parser.add_argument("--fresh-plan", action="store_true", help="Bypass the planning cache")
+    parser.add_argument("--server-pid", type=int, help="Server process id, to sample RSS")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON here")
+    args = parser.parse_args()
+
+    report = asyncio.run(Benchmark(args).run())
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Local stand-in for the AI Builder Space API, for load testing.
+
+Serves the OpenAI-compatible endpoints AIClient uses (chat completions,
+including streaming; image generations; audio transcriptions), with
+configurable latency distributions, 503 injection and a canned plan.
+
+Usage:
+    python scripts/mock_upstream.py --port 9100 --image-latency 6 --error-rate 0.05
+    AI_BUILDER_BASE_URL=http://localhost:9100/v1 AI_BUILDER_TOKEN=mock python main.py
+"""
+import re
+import math
+import json
+import time
+import uuid
+import base64
+import random
+import asyncio
+import argparse
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+# 1x1 PNG, used when Pillow is not installed
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+
+def canned_plan(round_num: int) -> dict:
+    """
+    Plan in the shape PromptEngine asks the model for.
+    Prompts carry a random tag so image caches see realistic misses.
+    """
+    tag = uuid.uuid4().hex[:6]
+    plan = []
+    for environment, kinds in (
+        ("earth", ["exploitation", "exploitation", "exploration"]),
+        ("mars", ["exploitation", "exploration", "exploration"])
+    ):
+        for i, kind in enumerate(kinds):
+            plan.append({
+                "name": f"{environment}_{kind[:7]}_{i + 1}",
+                "prompt": f"Mock {kind} concept {i + 1} for a modular home on {environment.title()}, "
+                          f"round {round_num}, timber and glass, warm light [{tag}]",
+                "type": kind,
+                "environment": environment,
+                "view": "interior" if environment == "mars" and i == 1 else "exterior"
+            })
+    return {
+        "updated_state": {
+            "round": round_num,
+            "design_summary": f"**Mock persona** after round {round_num}: compact, bright, adaptable.",
+            "livin_dna": ["modular", "timber", "glass", "warm light", "compact"],
+            "confirmed_preferences": ["natural materials"],
+            "rejected_elements": []
+        },
+        "plan": plan
+    }
+
+
+class Latency:
+    """
+    Latency distribution in seconds.
+
+    Args:
+        mean: Mean latency
+        distribution: "fixed", "uniform" (0..2*mean) or "lognormal"
+        sigma: Shape of the lognormal distribution (larger = heavier tail)
+    """
+
+    def __init__(self, mean: float, distribution: str = "lognormal", sigma: float = 0.5):
+        self.mean = mean
+        self.distribution = distribution
+        self.sigma = sigma
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "fixed":
+            return self.mean
+        if self.distribution == "uniform":
+            return random.uniform(0, 2 * self.mean)
+        # Lognormal with the requested mean
+        mu = math.log(self.mean) - self.sigma ** 2 / 2
+        return random.lognormvariate(mu, self.sigma)
+
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="Mock AI Builder Space")
+    latency = {
+        "plan": Latency(args.plan_latency, args.distribution, args.sigma),
+        "image": Latency(args.image_latency, args.distribution, args.sigma),
+        "transcribe": Latency(args.transcribe_latency, args.distribution, args.sigma)
+    }
+    stats = {"chat": 0, "images": 0, "transcriptions": 0, "errors": 0}
+
+    plan_override: Optional[dict] = None
+    if args.plan_file:
+        with open(args.plan_file) as f:
+            plan_override = json.load(f)
+
+    image_bytes = TINY_PNG
+    try:
+        from PIL import Image
+        import io
+        width, height = (int(v) for v in args.image_size.split("x"))
+        buf = io.BytesIO()
+        Image.new("RGB", (width, height), (180, 120, 90)).save(buf, format="PNG")
+        image_bytes = buf.getvalue()
+    except ImportError:
+        pass
+    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
+
+    def overloaded() -> Optional[JSONResponse]:
+        if random.random() < args.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Model overloaded (mock)", "type": "overloaded", "code": 503}},
+                status_code=503,
+                headers={"Retry-After": str(args.retry_after)}
+            )
+        return None
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        stats["chat"] += 1
+        body = await request.json()
+        if (error := overloaded()) is not None:
+            return error
+
+        prompt = json.dumps(body.get("messages", []))
+        match = re.search(r"Current Round: (\d+)", prompt)
+        plan = plan_override or canned_plan(int(match.group(1)) if match else 1)
+        content = json.dumps(plan, indent=2)
+        delay = latency["plan"].sample()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "mock")
+
+        if not body.get("stream"):
+            await asyncio.sleep(delay)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(prompt) + len(content)) // 4}
+            }
+
+        async def stream():
+            # Time to first token, then the rest spread evenly over the chunks
+            await asyncio.sleep(delay * 0.3)
+            chunks = [content[i:i + args.chunk_chars] for i in range(0, len(content), args.chunk_chars)]
+            per_chunk = delay * 0.7 / max(1, len(chunks))
+            for piece in chunks:
+                data = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(data)}\n\n"
+                await asyncio.sleep(per_chunk)
+            done = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/images/generations")
+    async def image_generations(request: Request):
+        stats["images"] += 1
+        body = await request.json()
+        if (error := overloaded()) is not None:
+            return error
+        await asyncio.sleep(latency["image"].sample())
+        return {
+            "created": int(time.time()),
+            "data": [{"b64_json": image_b64} for _ in range(int(body.get("n", 1)))]
+        }
+
+    @app.post("/v1/audio/transcriptions")
+    async def audio_transcriptions(request: Request):
+        stats["transcriptions"] += 1
+        await request.body()
+        if (error := overloaded()) is not None:
+            return error
+        await asyncio.sleep(latency["transcribe"].sample())
+        return {"text": "A cozy timber cabin with big windows.", "detected_language": "en", "confidence": 0.95}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock AI Builder Space upstream for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--plan-latency", type=float, default=4.0, help="Mean planning latency (s)")
+    parser.add_argument("--image-latency", type=float, default=8.0, help="Mean image latency (s)")
+    parser.add_argument("--transcribe-latency", type=float, default=1.0, help="Mean transcription latency (s)")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Lognormal shape (tail heaviness)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 503s")
+    parser.add_argument("--plan-file", help="JSON file returned instead of the canned plan")
+    parser.add_argument("--image-size", default="64x43", help="Size of the returned PNG (needs Pillow)")
+    parser.add_argument("--chunk-chars", type=int, default=64, help="Characters per streamed chunk")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
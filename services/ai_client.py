@@ -6,32 +6,142 @@ Uses OpenAI SDK for OpenAI-compatible API calls.
 import os
 import json
 import base64
-from typing import Optional, Dict, Any, List
-from openai import AsyncOpenAI
+import asyncio
+import importlib.util
+from typing import Optional, Dict, Any, List, AsyncIterator
+from email.utils import parsedate_to_datetime
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
+from services.uploads import media_type_for, upload_digest
+from services.errors import UpstreamError, UpstreamOverloadedError, UpstreamTimeoutError
+from services.hedging import Hedger
+from services.singleflight import request_key
 
 load_dotenv()
 
 
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)."""
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from datetime import datetime, timezone
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def to_upstream_error(e: Exception, operation: str) -> UpstreamError:
+    """Map an SDK or transport exception onto a typed UpstreamError."""
+    if isinstance(e, UpstreamError):
+        return e
+    if isinstance(e, openai.APITimeoutError):
+        return UpstreamTimeoutError(f"{operation} timed out")
+    if isinstance(e, openai.APIConnectionError):
+        return UpstreamTimeoutError(f"{operation} connection failed: {e}")
+    if isinstance(e, openai.APIStatusError):
+        status = e.status_code
+        retry_after = parse_retry_after(e.response.headers)
+        if status in (429, 503):
+            return UpstreamOverloadedError(status_code=status, retry_after=retry_after)
+        return UpstreamError(f"{operation} failed ({status}): {e}", status_code=status, retry_after=retry_after)
+    return UpstreamError(f"{operation} failed: {e}", retryable=False)
+
+
 class AIClient:
     """Unified AI client for AI Builder Space platform."""
     
     def __init__(self):
-        self.base_url = "https://space.ai-builders.com/backend/v1"
+        # Override to target a local stand-in (see scripts/mock_upstream.py)
+        self.base_url = os.getenv("AI_BUILDER_BASE_URL", "https://space.ai-builders.com/backend/v1").rstrip("/")
         self.token = os.getenv("AI_BUILDER_TOKEN")
         if not self.token:
             raise ValueError("AI_BUILDER_TOKEN environment variable is required")
         
+        # One long-lived connection pool shared by every upstream call
+        self.http_client = self._build_http_client()
         self.client = AsyncOpenAI(
             api_key=self.token,
-            base_url=self.base_url
+            base_url=self.base_url,
+            http_client=self.http_client,
+            # Retries are owned by services.retry, not stacked inside the SDK
+            max_retries=0
         )
+        self.transcribe_timeout = float(os.getenv("TRANSCRIBE_TIMEOUT", "60"))
+        
+        self.plan_model = "gemini-3-flash-preview"
+        self.image_model = "gemini-2.5-flash-image"
+        
+        # Cap concurrent image calls independently of the generation worker pool
+        self.image_concurrency = int(os.getenv("IMAGE_CONCURRENCY", "12"))
+        self.image_semaphore = asyncio.Semaphore(self.image_concurrency)
+        
+        # Optional hedging: duplicate image calls that run past the latency percentile
+        self.image_hedger = None
+        if os.getenv("IMAGE_HEDGING_ENABLED", "false").lower() == "true":
+            self.image_hedger = Hedger(
+                percentile=float(os.getenv("IMAGE_HEDGE_PERCENTILE", "95")),
+                min_samples=int(os.getenv("IMAGE_HEDGE_MIN_SAMPLES", "20")),
+                max_hedge_rate=float(os.getenv("IMAGE_HEDGE_MAX_RATE", "0.1")),
+                min_delay=float(os.getenv("IMAGE_HEDGE_MIN_DELAY", "1")),
+                operation="image"
+            )
+
+    
+    @staticmethod
+    def _build_http_client():
+        """
+        Build the pooled HTTP client from environment configuration.
+        HTTP/2 is used when enabled and the h2 package is installed.
+        """
+        http2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true"
+        if http2 and importlib.util.find_spec("h2") is None:
+            http2 = False
+        
+        # Limits/Timeout must come from the httpx build the SDK uses, which
+        # is not necessarily the top-level httpx package
+        limits_class = type(openai.DEFAULT_CONNECTION_LIMITS)
+        return DefaultAsyncHttpxClient(
+            http2=http2,
+            limits=limits_class(
+                max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "50")),
+                max_keepalive_connections=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20")),
+                keepalive_expiry=float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+            ),
+            timeout=openai.Timeout(
+                float(os.getenv("UPSTREAM_TIMEOUT", "180")),
+                connect=float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "10"))
+            )
+        )
+    
+    def plan_key(self, prompt: str, images: Optional[List[str]] = None) -> str:
+        """Single-flight key of a generate_plan (or open_plan_stream) request."""
+        return request_key(
+            operation="plan",
+            model=self.plan_model,
+            prompt=prompt,
+            images=[upload_digest(path) for path in images or []]
+        )
+    
+    def image_key(self, prompt: str, size: str) -> str:
+        """Single-flight key of a generate_image request."""
+        return request_key(operation="image", model=self.image_model, prompt=prompt, size=size)
+    
+    def images_key(self, prompt: str, n: int, size: str) -> str:
+        """Single-flight key of a generate_images request."""
+        return request_key(operation="images", model=self.image_model, prompt=prompt, size=size, n=n)
     
     async def generate_plan(
         self, 
         prompt: str, 
         state: Dict[str, Any],
-        images: Optional[List[str]] = None  # Base64 encoded images
+        images: Optional[List[str]] = None  # Prepared image file paths
     ) -> Dict[str, Any]:
         """
         Generate design plan using gemini-3-flash-preview model.
@@ -40,51 +150,18 @@ class AIClient:
         Args:
             prompt: The planning prompt
             state: Current design state
-            images: Optional list of base64 encoded images
+            images: Optional list of prepared image file paths
+                (base64-encoded here, right before the upstream call)
             
         Returns:
             Parsed JSON response with plan data
+            
+        Raises:
+            UpstreamError: Typed by status code; retryable for 429/5xx/timeouts
         """
         try:
-            # Build message content
-            content = []
-            
-            # Add images if provided
-            if images:
-                for img_b64 in images:
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{img_b64}"
-                        }
-                    })
-            
-            # Add text prompt
-            content.append({
-                "type": "text",
-                "text": prompt
-            })
-            
-            # Use OpenAI SDK to call chat completions
             response = await self.client.chat.completions.create(
-                model="gemini-3-flash-preview",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": content if images else prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=8192,
-                # Gemini-specific settings via extra_body
-                extra_body={
-                    "gemini": {
-                        "response_mime_type": "application/json",
-                        "thinking_config": {
-                            "thinking_level": "HIGH"
-                        }
-                    }
-                }
+                **await self._plan_request(prompt, images)
             )
             
             # Extract content from OpenAI-compatible response
@@ -99,11 +176,94 @@ class AIClient:
             plan_data = json.loads(content)
             return plan_data
             
+        except json.JSONDecodeError as e:
+            raise UpstreamError(f"Planning failed: invalid JSON from model ({e})", retryable=False)
+        except Exception as e:
+            raise to_upstream_error(e, "Planning")
+    
+    async def open_plan_stream(
+        self,
+        prompt: str,
+        state: Dict[str, Any],
+        images: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Start a streamed planning call.
+        
+        Errors while opening the stream are raised here, so the call can be
+        retried; errors mid-stream are raised from the returned iterator.
+        
+        Returns:
+            Async iterator over the text deltas of the JSON plan
+        """
+        try:
+            stream = await self.client.chat.completions.create(
+                **await self._plan_request(prompt, images),
+                stream=True
+            )
         except Exception as e:
-            err_str = str(e).lower()
-            if "503" in err_str or "overloaded" in err_str:
-                raise Exception("Model overloaded, please retry")
-            raise Exception(f"Planning failed: {str(e)}")
+            raise to_upstream_error(e, "Planning")
+        return self._iter_deltas(stream)
+    
+    @staticmethod
+    async def _iter_deltas(stream) -> AsyncIterator[str]:
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise to_upstream_error(e, "Planning")
+        finally:
+            await stream.close()
+    
+    async def _plan_request(self, prompt: str, images: Optional[List[str]]) -> Dict[str, Any]:
+        """Chat completion arguments shared by the plain and streamed planning calls."""
+        # Build message content
+        content = []
+        
+        # Add images if provided
+        if images:
+            for image_path in images:
+                img_b64 = await asyncio.to_thread(self._read_base64, image_path)
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{media_type_for(image_path)};base64,{img_b64}"
+                    }
+                })
+        
+        # Add text prompt
+        content.append({
+            "type": "text",
+            "text": prompt
+        })
+        
+        return {
+            "model": self.plan_model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content if images else prompt
+                }
+            ],
+            "temperature": 0.7,
+            "max_tokens": 8192,
+            # Gemini-specific settings via extra_body
+            "extra_body": {
+                "gemini": {
+                    "response_mime_type": "application/json",
+                    "thinking_config": {
+                        "thinking_level": "HIGH"
+                    }
+                }
+            }
+        }
+    
+    @staticmethod
+    def _read_base64(path: str) -> str:
+        """Read a file and return its base64 encoding."""
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode("utf-8")
     
     async def generate_image(
         self,
@@ -118,17 +278,19 @@ class AIClient:
             size: Image size (default: 1536x1024 for 16:9)
             
         Returns:
-            Image data as bytes, or None if generation failed
+            Image data as bytes, or None if generation failed permanently
+            
+        Raises:
+            UpstreamError: For transient failures worth retrying
         """
         try:
-            # Use OpenAI SDK's high-level images.generate() API
-            response = await self.client.images.generate(
-                prompt=prompt,
-                model="gemini-2.5-flash-image",
-                size=size,
-                n=1,
-                response_format="b64_json"
-            )
+            # The hedge shares the primary's slot, so the hedger times only the
+            # upstream call and never the wait for the concurrency cap
+            async with self.image_semaphore:
+                if self.image_hedger is not None:
+                    response = await self.image_hedger.run(self._images_generate, prompt, size)
+                else:
+                    response = await self._images_generate(prompt, size)
             
             # Extract base64 image data from response
             if not response.data or not response.data[0].b64_json:
@@ -140,16 +302,59 @@ class AIClient:
             return image_data
             
         except Exception as e:
-            err_str = str(e).lower()
-            if "503" in err_str or "overloaded" in err_str:
-                raise Exception("Model overloaded, please retry")
+            error = to_upstream_error(e, "Image generation")
+            if error.retryable:
+                raise error
             print(f"Image generation failed: {str(e)}")
             return None
     
+    async def generate_images(self, prompt: str, n: int, size: str = "1536x1024") -> List[bytes]:
+        """
+        Generate several images from one prompt in a single upstream call.
+        
+        Args:
+            prompt: Image prompt (e.g. PromptEngine.build_batch_image_prompt)
+            n: Number of images requested
+            size: Image size
+            
+        Returns:
+            The images returned, in order; may be fewer than n (empty if the
+            call failed permanently)
+            
+        Raises:
+            UpstreamError: For transient failures worth retrying
+        """
+        try:
+            response = await self._request_image(prompt, size, n=n)
+            return [base64.b64decode(item.b64_json) for item in response.data or [] if item.b64_json]
+        except Exception as e:
+            error = to_upstream_error(e, "Batched image generation")
+            if error.retryable:
+                raise error
+            print(f"Batched image generation failed: {str(e)}")
+            return []
+    
+    async def _request_image(self, prompt: str, size: str, n: int = 1):
+        """Single images.generate() call under the image concurrency cap."""
+        async with self.image_semaphore:
+            return await self._images_generate(prompt, size, n)
+    
+    async def _images_generate(self, prompt: str, size: str, n: int = 1):
+        """Raw images.generate() call; callers hold an image_semaphore slot."""
+        return await self.client.images.generate(
+            prompt=prompt,
+            model=self.image_model,
+            size=size,
+            n=n,
+            response_format="b64_json"
+        )
+    
     async def transcribe_audio(
         self,
         audio_file: bytes,
-        language: Optional[str] = None
+        language: Optional[str] = None,
+        filename: str = "audio.webm",
+        content_type: str = "audio/webm"
     ) -> Dict[str, Any]:
         """
         Transcribe audio using AI Builder Space transcription API.
@@ -157,47 +362,36 @@ class AIClient:
         Args:
             audio_file: Audio file data as bytes
             language: Optional BCP-47 language code hint (e.g., 'en', 'zh-CN')
+            filename: Upload filename
+            content_type: Media type of audio_file (e.g. audio/wav after preprocessing)
             
         Returns:
             Transcription response with text and metadata
+            
+        Raises:
+            UpstreamError: Typed by status code; retryable for 429/5xx/timeouts
         """
+        data = {}
+        if language:
+            data["language"] = language
+        
         try:
-            import io
-            import httpx
-            
-            # Create a file-like object from bytes
-            audio_io = io.BytesIO(audio_file)
-            
-            # Prepare multipart form data
-            files = {
-                "audio_file": ("audio.webm", audio_io, "audio/webm")
-            }
-            data = {}
-            if language:
-                data["language"] = language
-            
-            # Use httpx to make multipart/form-data request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/audio/transcriptions",
-                    headers={
-                        "Authorization": f"Bearer {self.token}"
-                    },
-                    files=files,
-                    data=data,
-                    timeout=60.0
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"Transcription failed: {response.text}")
-                
-                result = response.json()
-                return result
-            
+            # Multipart request through the SDK so it shares the pool and
+            # raises the same exception types as the other calls
+            return await self.client.post(
+                "/audio/transcriptions",
+                cast_to=object,
+                body=data,
+                files=[("audio_file", (filename, audio_file, content_type))],
+                options={
+                    "headers": {"Content-Type": "multipart/form-data"},
+                    "timeout": self.transcribe_timeout
+                }
+            )
         except Exception as e:
             print(f"Audio transcription failed: {str(e)}")
-            raise Exception(f"Transcription failed: {str(e)}")
+            raise to_upstream_error(e, "Transcription")
     
     async def close(self):
-        """Close the OpenAI client."""
+        """Close the OpenAI client and its shared connection pool."""
         await self.client.close()
@@ -0,0 +1,225 @@
+"""
+Audio pipeline for Dream LIVIN Shop voice notes.
+With ffmpeg available, recordings are streamed through it to trim silence and
+downmix/resample to 16 kHz mono, then split into overlapping chunks that are
+transcribed concurrently and stitched back together. Without ffmpeg the
+recording is sent as a single upload, as before.
+"""
+import io
+import os
+import re
+import wave
+import shutil
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+
+FFMPEG_PATH = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+AUDIO_PREPROCESSING_ENABLED = os.getenv("AUDIO_PREPROCESSING_ENABLED", "true").lower() == "true"
+TRANSCRIBE_SAMPLE_RATE = int(os.getenv("TRANSCRIBE_SAMPLE_RATE", "16000"))
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "30"))
+TRANSCRIBE_CHUNK_OVERLAP = float(os.getenv("TRANSCRIBE_CHUNK_OVERLAP", "1.5"))
+AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-45"))
+AUDIO_SILENCE_MIN_SECONDS = float(os.getenv("AUDIO_SILENCE_MIN_SECONDS", "0.7"))
+
+READ_BLOCK = 64 * 1024
+SAMPLE_WIDTH = 2  # 16-bit PCM
+# Words compared when removing text repeated across a chunk overlap
+MAX_OVERLAP_WORDS = 12
+
+
+class AudioChunk:
+    """One upload for the transcription API."""
+
+    def __init__(self, index: int, data: bytes, filename: str, content_type: str):
+        self.index = index
+        self.data = data
+        self.filename = filename
+        self.content_type = content_type
+
+
+class AudioPipeline:
+    """
+    Prepares recordings for transcription.
+
+    Args:
+        ffmpeg_path: ffmpeg executable, or None to skip preprocessing
+        sample_rate: Sample rate the recognizer expects
+        chunk_seconds: Longest chunk sent in one request
+        overlap_seconds: Audio shared by consecutive chunks, so words cut at
+            a boundary are heard whole by one of them
+    """
+
+    def __init__(
+        self,
+        ffmpeg_path: Optional[str] = FFMPEG_PATH if AUDIO_PREPROCESSING_ENABLED else None,
+        sample_rate: int = TRANSCRIBE_SAMPLE_RATE,
+        chunk_seconds: float = TRANSCRIBE_CHUNK_SECONDS,
+        overlap_seconds: float = TRANSCRIBE_CHUNK_OVERLAP
+    ):
+        self.ffmpeg_path = ffmpeg_path
+        self.sample_rate = sample_rate
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = min(overlap_seconds, chunk_seconds / 2)
+
+    async def prepare(self, source: BinaryIO, filename: str, content_type: str) -> List[AudioChunk]:
+        """
+        Turn a recording into transcription chunks.
+
+        Args:
+            source: Seekable binary file with the recording (read in blocks)
+            filename: Original filename, used for the unprocessed fallback
+            content_type: Original media type, used for the unprocessed fallback
+
+        Returns:
+            Chunks in playback order (empty if the recording is all silence)
+        """
+        if self.ffmpeg_path:
+            try:
+                pcm = await self._to_pcm(source)
+                return self._split(pcm)
+            except Exception as e:
+                print(f"Audio preprocessing failed, sending the recording as-is: {e}")
+                await asyncio.to_thread(source.seek, 0)
+
+        data = await asyncio.to_thread(source.read)
+        return [AudioChunk(0, data, filename, content_type)]
+
+    async def _to_pcm(self, source: BinaryIO) -> bytes:
+        """Stream the recording through ffmpeg: trim silence, mono, resample, raw 16-bit PCM."""
+        silence = (
+            f"silenceremove=start_periods=1:start_threshold={AUDIO_SILENCE_THRESHOLD_DB}dB:"
+            f"stop_periods=-1:stop_duration={AUDIO_SILENCE_MIN_SECONDS}:"
+            f"stop_threshold={AUDIO_SILENCE_THRESHOLD_DB}dB"
+        )
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg_path, "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-af", silence,
+            "-ac", "1", "-ar", str(self.sample_rate),
+            "-f", "s16le", "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        async def feed():
+            try:
+                while True:
+                    block = await asyncio.to_thread(source.read, READ_BLOCK)
+                    if not block:
+                        break
+                    process.stdin.write(block)
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg exited early; its stderr explains why
+            finally:
+                process.stdin.close()
+
+        try:
+            _, pcm, errors = await asyncio.gather(feed(), process.stdout.read(), process.stderr.read())
+            await process.wait()
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+            raise
+        if process.returncode != 0:
+            raise RuntimeError(errors.decode("utf-8", "replace").strip() or f"ffmpeg exited with {process.returncode}")
+        return pcm
+
+    def _split(self, pcm: bytes) -> List[AudioChunk]:
+        """Cut PCM into overlapping WAV chunks."""
+        frame = SAMPLE_WIDTH  # mono
+        chunk_bytes = int(self.chunk_seconds * self.sample_rate) * frame
+        step = chunk_bytes - int(self.overlap_seconds * self.sample_rate) * frame
+        chunks = []
+        start = 0
+        while start < len(pcm):
+            end = min(len(pcm), start + chunk_bytes)
+            chunks.append(AudioChunk(len(chunks), self._wav(pcm[start:end]), f"chunk_{len(chunks)}.wav", "audio/wav"))
+            if end == len(pcm):
+                break
+            start += step
+        return chunks
+
+    def _wav(self, pcm: bytes) -> bytes:
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(SAMPLE_WIDTH)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm)
+        return buf.getvalue()
+
+
+def _words(text: str) -> List[str]:
+    return [re.sub(r"[^\w']", "", word).lower() for word in text.split()]
+
+
+def stitch(texts: List[str]) -> str:
+    """
+    Join chunk transcripts, dropping words repeated across an overlap.
+
+    The longest run of words that ends the previous text and starts the
+    next one (compared without case or punctuation) is kept only once.
+    """
+    result: List[str] = []
+    for text in texts:
+        words = text.split()
+        if not words:
+            continue
+        tail, head = _words(" ".join(result[-MAX_OVERLAP_WORDS:])), _words(" ".join(words[:MAX_OVERLAP_WORDS]))
+        overlap = 0
+        for size in range(min(len(tail), len(head)), 0, -1):
+            if tail[-size:] == head[:size]:
+                overlap = size
+                break
+        result.extend(words[overlap:])
+    return " ".join(result)
+
+
+async def transcribe_chunks(
+    chunks: List[AudioChunk],
+    transcribe: Callable[[AudioChunk], Awaitable[Dict[str, Any]]],
+    concurrency: int = 4
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Transcribe chunks concurrently, yielding progress as they finish.
+
+    Yields:
+        ("partial", {"text", "chunks_done", "chunks_total"}) whenever a chunk
+        finishes (text covers the chunks finished so far, in order), then
+        ("completed", {"text", "language", "confidence"})
+
+    Raises:
+        Whatever transcribe raises; the remaining chunks are cancelled
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results: List[Optional[Dict[str, Any]]] = [None] * len(chunks)
+
+    async def run(chunk: AudioChunk):
+        async with semaphore:
+            results[chunk.index] = await transcribe(chunk)
+
+    tasks = [asyncio.create_task(run(chunk)) for chunk in chunks]
+    try:
+        done = 0
+        for finished in asyncio.as_completed(tasks):
+            await finished
+            done += 1
+            ready = []
+            for result in results:
+                if result is None:
+                    break
+                ready.append(result.get("text", ""))
+            yield "partial", {"text": stitch(ready), "chunks_done": done, "chunks_total": len(chunks)}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    confidences = [r["confidence"] for r in results if r.get("confidence") is not None]
+    yield "completed", {
+        "text": stitch([r.get("text", "") for r in results]),
+        "language": next((r["detected_language"] for r in results if r.get("detected_language")), None),
+        "confidence": sum(confidences) / len(confidences) if confidences else None
+    }
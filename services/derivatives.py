@@ -0,0 +1,92 @@
+"""
+Image derivatives for Dream LIVIN Shop.
+Builds thumbnails and compressed WebP/AVIF copies of generated PNGs in a
+process pool, so encoding never holds the GIL of the serving event loop.
+"""
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow is optional; originals are served as-is without it
+    Image = None
+    features = None
+
+
+THUMBNAIL_SIZE = (384, 256)
+
+# variant -> (filename suffix, media type, Pillow format)
+VARIANTS = {
+    "thumb": (".thumb.webp", "image/webp", "WEBP"),
+    "webp": (".webp", "image/webp", "WEBP"),
+    "avif": (".avif", "image/avif", "AVIF"),
+}
+
+
+def variant_filename(filename: str, variant: str) -> str:
+    """Filename of a derivative next to its original."""
+    suffix = VARIANTS[variant][0]
+    return os.path.splitext(filename)[0] + suffix
+
+
+def build_derivatives(filepath: str) -> Dict[str, int]:
+    """
+    Encode every supported derivative of an image (runs in a worker process).
+
+    Returns:
+        Mapping of derivative filename to its size in bytes
+    """
+    directory, filename = os.path.split(filepath)
+    built = {}
+
+    def save(variant: str, img, **params):
+        name = variant_filename(filename, variant)
+        path = os.path.join(directory, name)
+        tmp_path = f"{path}.tmp"
+        img.save(tmp_path, format=VARIANTS[variant][2], **params)
+        os.replace(tmp_path, path)
+        built[name] = os.path.getsize(path)
+
+    with Image.open(filepath) as source:
+        img = source.convert("RGB")
+
+    save("webp", img, quality=80, method=4)
+    if features.check("avif"):
+        save("avif", img, quality=55)
+
+    thumb = img.copy()
+    thumb.thumbnail(THUMBNAIL_SIZE)
+    save("thumb", thumb, quality=75, method=4)
+    return built
+
+
+class DerivativeBuilder:
+    """Runs build_derivatives on a lazily created process pool."""
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self.enabled = Image is not None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        if not self.enabled:
+            print("Pillow not installed: thumbnail/WebP derivatives disabled")
+
+    async def build(self, filepath: str) -> Dict[str, int]:
+        """Build derivatives for a saved image; returns {} when disabled."""
+        if not self.enabled:
+            return {}
+        if self._executor is None:
+            # Forking would copy the event loop, its threads and open sockets into the workers
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, build_derivatives, filepath)
+
+    def close(self):
+        """Shut the process pool down."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
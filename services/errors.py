@@ -0,0 +1,65 @@
+"""
+Typed upstream errors for Dream LIVIN Shop.
+AIClient raises these instead of plain Exceptions so retry decisions can use
+the status code and Retry-After hint rather than matching message text.
+"""
+from typing import Optional
+
+
+# Status codes worth retrying: timeouts, rate limits and server-side failures
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """
+    Failure returned by (or while reaching) the AI Builder Space API.
+
+    Args:
+        message: Human-readable description
+        status_code: HTTP status from upstream, if any
+        retry_after: Seconds the upstream asked us to wait, if given
+        retryable: Whether repeating the same call may succeed
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: Optional[bool] = None
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        if retryable is None:
+            retryable = status_code in RETRYABLE_STATUS_CODES
+        self.retryable = retryable
+
+
+class UpstreamOverloadedError(UpstreamError):
+    """Upstream is rate limiting or overloaded (429/503)."""
+
+    def __init__(self, message: str = "Model overloaded, please retry", **kwargs):
+        kwargs.setdefault("retryable", True)
+        super().__init__(message, **kwargs)
+
+
+class UpstreamTimeoutError(UpstreamError):
+    """The upstream call timed out or the connection failed."""
+
+    def __init__(self, message: str = "Upstream request timed out", **kwargs):
+        kwargs.setdefault("retryable", True)
+        super().__init__(message, **kwargs)
+
+
+class CircuitOpenError(UpstreamError):
+    """Calls are being rejected locally because upstream is failing."""
+
+    def __init__(self, operation: str, retry_after: float):
+        super().__init__(
+            f"Upstream {operation} temporarily unavailable, please retry shortly",
+            status_code=503,
+            retry_after=retry_after,
+            retryable=False
+        )
+        self.operation = operation
@@ -0,0 +1,117 @@
+"""
+Request hedging for Dream LIVIN Shop.
+When an upstream call runs longer than a percentile of recent latencies, a
+duplicate is launched and whichever finishes first wins; the other is
+cancelled. A rolling cap keeps hedges to a small share of calls.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+from services import metrics
+
+
+class Hedger:
+    """
+    Latency-percentile hedging for one kind of upstream call.
+
+    Args:
+        percentile: Hedge once a call outlives this percentile of recent latencies
+        window: Number of recent latencies and calls considered
+        min_samples: Latencies needed before hedging starts
+        max_hedge_rate: Maximum share of recent calls that may be hedged
+        min_delay: Never hedge sooner than this many seconds
+        operation: Label for the hedging metrics
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        window: int = 200,
+        min_samples: int = 20,
+        max_hedge_rate: float = 0.1,
+        min_delay: float = 1.0,
+        operation: str = "upstream"
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_rate = max_hedge_rate
+        self.min_delay = min_delay
+        self.operation = operation
+        self._latencies = deque(maxlen=window)
+        self._recent_hedged = deque(maxlen=window)  # one bool per call
+        self.calls = 0
+        self.hedges = 0
+        self.hits = 0    # hedge finished first
+        self.wasted = 0  # hedge launched but the original won
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little data."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        rank = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[rank])
+
+    def _may_hedge(self) -> bool:
+        if not self._recent_hedged:
+            return False
+        return sum(self._recent_hedged) < self.max_hedge_rate * len(self._recent_hedged)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hits": self.hits,
+            "wasted": self.wasted,
+            "delay": self.hedge_delay()
+        }
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Call func, hedging it with a duplicate call if it runs long.
+
+        Returns:
+            The result of whichever call succeeds first
+        """
+        loop = asyncio.get_running_loop()
+        self.calls += 1
+        metrics.HEDGED_CALLS.labels(self.operation).inc()
+
+        async def timed():
+            started = loop.time()
+            result = await func(*args, **kwargs)
+            self._latencies.append(loop.time() - started)
+            return result
+
+        primary = asyncio.create_task(timed())
+        delay = self.hedge_delay()
+        if delay is not None:
+            try:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+            except asyncio.CancelledError:
+                primary.cancel()
+                raise
+            if not done and self._may_hedge():
+                self._recent_hedged.append(True)
+                return await self._race(primary, asyncio.create_task(timed()))
+        self._recent_hedged.append(False)
+        return await primary
+
+    async def _race(self, primary: asyncio.Task, hedge: asyncio.Task) -> Any:
+        self.hedges += 1
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next(iter(done))
+                if winner.exception() is None or not pending:
+                    if winner is hedge:
+                        self.hits += 1
+                    else:
+                        self.wasted += 1
+                    metrics.HEDGES.labels(self.operation, "hit" if winner is hedge else "wasted").inc()
+                    return winner.result()
+                # First finisher failed; keep waiting on the other call
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,113 @@
+"""
+Image cache for Dream LIVIN Shop.
+Content-addressed store of generated images keyed on the final image prompt,
+so an identical request never has to go back to the upstream image model.
+"""
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+
+class ImageCache:
+    """
+    On-disk PNG cache with size-bounded LRU eviction.
+
+    Files are named after the SHA-256 of (model, size, prompt), so several
+    worker processes can share one directory safely.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._index = OrderedDict()  # key -> size in bytes, oldest first
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(prompt: str, size: str, model: str = "") -> str:
+        """Hash everything that determines the upstream output."""
+        digest = hashlib.sha256()
+        for part in (model, size, prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_batch_key(prompt: str, n: int, position: int, size: str, model: str = "") -> str:
+        """Key for output `position` of one call asking for n images of prompt."""
+        return ImageCache.make_key(f"{prompt}\0{n}\0{position}", size, model)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def _scan(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        entries.sort()
+        return entries
+
+    async def load(self):
+        """Rebuild the LRU index from disk (mtime order) after a restart."""
+        entries = await asyncio.to_thread(self._scan)
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        await self._evict()
+
+    def _read(self, key: str) -> bytes:
+        path = self._path(key)
+        with open(path, "rb") as f:
+            data = f.read()
+        # Refresh mtime so recency survives a restart
+        os.utime(path)
+        return data
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return cached image bytes, or None on a miss."""
+        try:
+            data = await asyncio.to_thread(self._read, key)
+        except FileNotFoundError:
+            self._index.pop(key, None)
+            return None
+
+        self._index[key] = len(data)
+        self._index.move_to_end(key)
+        return data
+
+    async def put(self, key: str, data: bytes):
+        """Store image bytes under their key and evict the least recently used."""
+        await asyncio.to_thread(self._write, key, data)
+        self._index[key] = len(data)
+        self._index.move_to_end(key)
+        await self._evict()
+
+    async def _evict(self):
+        victims = []
+        while len(self._index) > self.max_entries:
+            key, _ = self._index.popitem(last=False)
+            victims.append(self._path(key))
+        if victims:
+            await asyncio.to_thread(_remove_files, victims)
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error deleting {path}: {e}")
@@ -0,0 +1,98 @@
+"""
+Image index for Dream LIVIN Shop.
+Tracks stored images oldest-first with their sizes, so retention limits are
+enforced incrementally on each write instead of rescanning the directory.
+"""
+import os
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List
+
+
+def image_stem(filename: str) -> str:
+    """Group key shared by an original image and its derivatives."""
+    return filename.split(".", 1)[0]
+
+
+class ImageIndex:
+    """
+    Ordered record of images in a directory.
+
+    An original and its derivatives (thumbnail, WebP, ...) share a stem and
+    are counted, sized and evicted together.
+
+    Args:
+        directory: Directory holding the images
+        max_count: Maximum number of images kept (0 = unlimited)
+        max_bytes: Maximum total size in bytes (0 = unlimited)
+    """
+
+    def __init__(self, directory: str, max_count: int = 1000, max_bytes: int = 0):
+        self.directory = directory
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()  # stem -> {filename: size}, oldest first
+        self.total_bytes = 0
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._images.get(image_stem(filename), ())
+
+    def _scan(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_ctime, entry.name, stat.st_size))
+        entries.sort()
+        return entries
+
+    async def load(self):
+        """Rebuild the index from disk (creation order) and enforce limits."""
+        entries = await asyncio.to_thread(self._scan)
+        self._images = OrderedDict()
+        self.total_bytes = 0
+        for _, name, size in entries:
+            self._images.setdefault(image_stem(name), {})[name] = size
+            self.total_bytes += size
+        await self.remove(self._over_limit())
+
+    def _over_limit(self) -> List[str]:
+        victims = []
+        while self._images and (
+            (self.max_count and len(self._images) > self.max_count)
+            or (self.max_bytes and self.total_bytes > self.max_bytes)
+        ):
+            _, files = self._images.popitem(last=False)
+            self.total_bytes -= sum(files.values())
+            victims.extend(files)
+        return victims
+
+    def add(self, filename: str, size: int) -> List[str]:
+        """
+        Record a newly written file (an original or one of its derivatives).
+
+        Returns:
+            Filenames that fell outside the retention limits and should be deleted
+        """
+        stem = image_stem(filename)
+        files: Dict[str, int] = self._images.setdefault(stem, {})
+        self.total_bytes += size - files.get(filename, 0)
+        files[filename] = size
+        return self._over_limit()
+
+    async def remove(self, filenames: List[str]):
+        """Delete files from disk in a worker thread."""
+        if filenames:
+            paths = [os.path.join(self.directory, name) for name in filenames]
+            await asyncio.to_thread(_remove_files, paths)
+
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error deleting {path}: {e}")
@@ -0,0 +1,158 @@
+"""
+Prometheus metrics for Dream LIVIN Shop.
+Stage histograms, upstream counters and gauges for the generation pipeline,
+exposed on /metrics. Without prometheus-client installed every metric is a
+no-op and /metrics reports that metrics are unavailable.
+"""
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Optional, Tuple
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+    )
+except ImportError:  # prometheus-client is optional
+    CollectorRegistry = None
+
+
+ENABLED = CollectorRegistry is not None
+
+# Seconds; image calls routinely take 5-30s upstream
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+class _NoopMetric:
+    """Stands in for any metric when prometheus-client is missing."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+    def track_inprogress(self):
+        return nullcontext()
+
+
+if ENABLED:
+    REGISTRY = CollectorRegistry()
+    STAGE_SECONDS = Histogram(
+        "livin_stage_seconds", "Time spent in each generation pipeline stage",
+        ["stage"], buckets=BUCKETS, registry=REGISTRY
+    )
+    UPSTREAM_SECONDS = Histogram(
+        "livin_upstream_seconds", "Latency of single upstream attempts",
+        ["operation"], buckets=BUCKETS, registry=REGISTRY
+    )
+    UPSTREAM_RETRIES = Counter(
+        "livin_upstream_retries_total", "Upstream calls retried after a transient error",
+        ["operation"], registry=REGISTRY
+    )
+    UPSTREAM_ERRORS = Counter(
+        "livin_upstream_errors_total", "Upstream errors by HTTP status (or 'none' for transport errors)",
+        ["operation", "status"], registry=REGISTRY
+    )
+    UPSTREAM_COALESCED = Counter(
+        "livin_upstream_coalesced_total", "Calls that joined an identical in-flight upstream call",
+        ["operation"], registry=REGISTRY
+    )
+    UPSTREAM_SINGLE_FLIGHT_CALLS = Counter(
+        "livin_upstream_single_flight_calls_total", "Upstream calls started by the single-flight layer",
+        ["operation"], registry=REGISTRY
+    )
+    HEDGED_CALLS = Counter(
+        "livin_hedged_calls_total", "Upstream calls run under the hedger",
+        ["operation"], registry=REGISTRY
+    )
+    HEDGES = Counter(
+        "livin_hedges_total", "Hedge requests by outcome (hit: the hedge won; wasted: the original won)",
+        ["operation", "outcome"], registry=REGISTRY
+    )
+    UPSTREAM_IN_FLIGHT = Gauge(
+        "livin_upstream_in_flight", "Upstream calls currently in flight",
+        ["operation"], registry=REGISTRY
+    )
+    CACHE_LOOKUPS = Counter(
+        "livin_cache_lookups_total", "Plan and image cache lookups",
+        ["cache", "result"], registry=REGISTRY
+    )
+    IMAGE_FAILURES = Counter(
+        "livin_image_failures_total", "Plan items that produced no image",
+        registry=REGISTRY
+    )
+    IMAGE_BATCH_CALLS_SAVED = Counter(
+        "livin_image_batch_calls_saved_total", "Image calls avoided by multi-output batched calls",
+        registry=REGISTRY
+    )
+    SPECULATIVE_PLANS = Counter(
+        "livin_speculative_plans_total", "Speculative plans after DNA edits by outcome",
+        ["outcome"], registry=REGISTRY
+    )
+    TASKS = Counter(
+        "livin_tasks_total", "Finished generation tasks by outcome",
+        ["outcome"], registry=REGISTRY
+    )
+    ACTIVE_TASKS = Gauge(
+        "livin_active_tasks", "Task records held in the task store",
+        registry=REGISTRY
+    )
+    QUEUED_TASKS = Gauge(
+        "livin_queued_tasks", "Generation jobs waiting for a worker",
+        registry=REGISTRY
+    )
+    RUNNING_TASKS = Gauge(
+        "livin_running_tasks", "Generation jobs currently running",
+        registry=REGISTRY
+    )
+else:
+    REGISTRY = None
+    STAGE_SECONDS = UPSTREAM_SECONDS = UPSTREAM_RETRIES = UPSTREAM_ERRORS = _NoopMetric()
+    UPSTREAM_COALESCED = UPSTREAM_IN_FLIGHT = CACHE_LOOKUPS = IMAGE_FAILURES = _NoopMetric()
+    UPSTREAM_SINGLE_FLIGHT_CALLS = HEDGED_CALLS = HEDGES = _NoopMetric()
+    IMAGE_BATCH_CALLS_SAVED = SPECULATIVE_PLANS = TASKS = _NoopMetric()
+    ACTIVE_TASKS = QUEUED_TASKS = RUNNING_TASKS = _NoopMetric()
+
+
+@contextmanager
+def stage(name: str, timings: Optional[dict] = None):
+    """
+    Time a pipeline stage into the stage histogram.
+
+    Args:
+        name: Stage label
+        timings: Optional dict that also receives the duration (seconds) under name
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        if timings is not None:
+            timings[name] = round(elapsed, 4)
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    if not ENABLED:
+        return b"# prometheus-client not installed; metrics disabled\n", "text/plain; charset=utf-8"
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
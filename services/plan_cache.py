@@ -0,0 +1,56 @@
+"""
+Planning cache for Dream LIVIN Shop.
+Memoizes AIClient.generate_plan responses for identical planning inputs
+(double-submits, retries from the frontend, repeated default prompts).
+"""
+import copy
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+
+class PlanCache:
+    """
+    In-process LRU cache of plan data with a TTL.
+
+    Keys are a canonical hash of the planning prompt (which already embeds the
+    feedback and serialized state) plus the digests of any uploaded images.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (stored_at, plan_data)
+
+    @staticmethod
+    def make_key(prompt: str, image_digests: Optional[List[str]] = None, model: str = "") -> str:
+        """Hash the prompt, model and image digests into a cache key."""
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        for image_digest in image_digests or []:
+            digest.update(b"\0")
+            digest.update(image_digest.encode("utf-8"))
+        return digest.hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a private copy of a cached plan, or None."""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: str, plan_data: Dict[str, Any]):
+        """Store a copy of plan data, evicting the least recently used entries."""
+        self._entries[key] = (time.monotonic(), copy.deepcopy(plan_data))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,89 @@
+"""
+Incremental planning-response parser for Dream LIVIN Shop.
+Scans the streamed JSON plan as it arrives and hands back "updated_state"
+and each "plan" item as soon as its closing brace is seen, so image
+rendering can start before the model has finished the whole response.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PlanStreamParser:
+    """
+    Feed text chunks in order; each call returns newly completed parts.
+
+    Events are ("updated_state", dict) and ("plan_item", dict). Only
+    structural characters are tracked, so each byte is scanned once.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._value_start = -1
+        self._item_start = -1
+        self.updated_state: Optional[Dict[str, Any]] = None
+        self.plan: List[Dict[str, Any]] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume a chunk of model output and return completed events."""
+        self._buffer += chunk
+        events = []
+        buf = self._buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_start >= 0:
+                        self._key = json.loads(buf[self._string_start:i + 1])
+                        self._string_start = -1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._string_start = i
+                    self._expect_key = False
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = True
+                elif self._depth == 2:
+                    self._value_start = i
+                elif self._depth == 3 and self._key == "plan" and ch == "{":
+                    self._item_start = i
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start >= 0:
+                    item = json.loads(buf[self._item_start:i + 1])
+                    self._item_start = -1
+                    self.plan.append(item)
+                    events.append(("plan_item", item))
+                elif self._depth == 1 and self._value_start >= 0:
+                    if self._key == "updated_state":
+                        self.updated_state = json.loads(buf[self._value_start:i + 1])
+                        events.append(("updated_state", self.updated_state))
+                    self._value_start = -1
+            elif ch == "," and self._depth == 1:
+                self._expect_key = True
+
+        self._pos = len(buf)
+        return events
+
+    def result(self) -> Dict[str, Any]:
+        """Parse the complete response once the stream has ended."""
+        text = self._buffer
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            raise json.JSONDecodeError("No JSON object in planning stream", text, 0)
+        return json.loads(text[start:end + 1])
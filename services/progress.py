@@ -0,0 +1,56 @@
+"""
+Progress broker for Dream LIVIN Shop.
+Fans out generation task updates to Server-Sent Events subscribers so the
+frontend no longer has to poll /api/status.
+"""
+import asyncio
+import json
+from typing import Dict, Any, Set
+
+
+# Events after which a task stream is finished
+TERMINAL_EVENTS = ("completed", "failed", "cancelled")
+
+
+class ProgressBroker:
+    """In-process publish/subscribe hub keyed by task id."""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        """Register a new subscriber queue for a task."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue):
+        """Remove a subscriber queue, dropping the task entry when empty."""
+        queues = self._subscribers.get(task_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[task_id]
+
+    def publish(self, task_id: str, event: str, data: Dict[str, Any]):
+        """
+        Push an event to every subscriber of a task.
+
+        Slow consumers lose their oldest pending event rather than blocking
+        the generation task.
+        """
+        for queue in list(self._subscribers.get(task_id, ())):
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait((event, data))
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Serialize an event in text/event-stream wire format."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
@@ -52,57 +52,15 @@ Architecture: Smart modular design that feels like home despite being on another
 Mood: Safe haven, warmth within the wild, human resilience, comfortable minimalism with design sensibility.
 """
 
-    def __init__(self):
-        pass
-    
-    def get_style_phase(self, round_num: int) -> str:
-        """Determine style phase based on round number."""
-        return "early" if round_num <= 2 else "mature"
+    # Only the most recent inputs are shown to the planner
+    HISTORY_WINDOW = 5
     
-    def build_planning_prompt(
-        self,
-        feedback: str,
-        state: Dict[str, Any],
-        user_images_description: Optional[str] = None
-    ) -> str:
-        """
-        Build the planning prompt for the LIVIN DNA Manager.
-        
-        Args:
-            feedback: User's current feedback/input
-            state: Current LIVIN DNA state
-            user_images_description: Optional description of uploaded images
-            
-        Returns:
-            Complete planning prompt string
-        """
-        current_round = state.get('round', 0) + 1
-        style_phase = self.get_style_phase(current_round)
-        style_config = self.STYLE_EVOLUTION[style_phase]
-        
-        # Build history context
-        history_context = ""
-        if state.get('feedback_history'):
-            history_context = "Previous user inputs:\n" + "\n".join(
-                [f"- Round {i+1}: {h}" for i, h in enumerate(state.get('feedback_history', [])[-5:])]
-            )
-        
-        prompt = f"""You are the 'LIVIN Genome Architect' - an AI that helps users discover and refine their dream modular mobile home design for both Earth and Mars.
+    PLANNING_HEADER = """You are the 'LIVIN Genome Architect' - an AI that helps users discover and refine their dream modular mobile home design for both Earth and Mars.
 
 Current LIVIN DNA State:
-{json.dumps(state, indent=2, ensure_ascii=False)}
-
-{history_context}
-
-User's New Input: "{feedback}"
-
-{f"User uploaded images showing: {user_images_description}" if user_images_description else ""}
-
-Current Round: {current_round}
-Style Phase: {style_phase} ({style_config['ratio']})
-Include Human Characters: {style_config['include_characters']}
+"""
 
-=== YOUR TASKS ===
+    PLANNING_TASKS = """=== YOUR TASKS ===
 
 1. **UPDATE LIVIN DNA** (Maximum 8 keywords):
    Extract and refine keywords that capture the user's dream home DNA across these dimensions:
@@ -140,19 +98,18 @@ Include Human Characters: {style_config['include_characters']}
    - view: "exterior", "interior", or "both"
 
 4. **STYLE INSTRUCTIONS FOR THIS ROUND**:
-   {"Focus on hand-drawn architectural sketches and sci-fi illustration styles. Minimal photorealistic rendering." if style_phase == "early" else "Focus on cinematic, photorealistic renders. Include human figures in natural living scenarios where appropriate."}
+   {style_instructions}
 
 === OUTPUT FORMAT ===
 Respond ONLY with valid JSON:
 
 {{
   "updated_state": {{
-    "round": {current_round},
+    "round": {{current_round}},
     "design_summary": "Markdown narrative of user's LIVIN Persona...",
     "livin_dna": ["keyword1", "keyword2", ...],  // Max 8 keywords
     "confirmed_preferences": ["specific preference 1", "preference 2"],
-    "rejected_elements": ["rejected element 1", ...],
-    "feedback_history": [...previous + current feedback...]
+    "rejected_elements": ["rejected element 1", ...]
   }},
   "plan": [
     {{
@@ -165,8 +122,124 @@ Respond ONLY with valid JSON:
     // ... 5 more entries (3 earth + 3 mars total)
   ]
 }}
+(Do not repeat feedback_history; it is kept by the server.)
+"""
+
+    STYLE_INSTRUCTIONS = {
+        "early": "Focus on hand-drawn architectural sketches and sci-fi illustration styles. Minimal photorealistic rendering.",
+        "mature": "Focus on cinematic, photorealistic renders. Include human figures in natural living scenarios where appropriate."
+    }
+    
+    IMAGE_STYLES = {
+        "early": {
+            False: "hand-drawn architectural concept sketch with soft watercolor touches"
+        },
+        "mature": {
+            True: "cinematic photorealistic render with natural human figures in a lifestyle scene",
+            False: "cinematic photorealistic architectural visualization"
+        }
+    }
+    
+    IMAGE_REQUIREMENTS = """
+Technical Requirements:
+- High quality, detailed visualization
+- Consistent modular architecture language
+- {rendering}
+- 16:9 aspect ratio composition
+- No text, logos, or watermarks
 """
-        return prompt
+
+    DEFAULT_LOCATIONS = {
+        "earth": "a scenic location perfect for modular living",
+        "mars": "Jezero Crater region, Mars"
+    }
+    
+    def __init__(self):
+        # Static sections are formatted once per style phase, not per request
+        self._planning_tasks = {}
+        self._image_bases = {}
+        self._image_requirements = {}
+        for phase, config in self.STYLE_EVOLUTION.items():
+            self._planning_tasks[phase] = self.PLANNING_TASKS.format(
+                style_instructions=self.STYLE_INSTRUCTIONS[phase]
+            )
+            style = self.IMAGE_STYLES[phase].get(config["include_characters"], self.IMAGE_STYLES[phase].get(False))
+            # Location stays a placeholder; it is the only per-request part
+            self._image_bases[phase] = {
+                "earth": self.EARTH_BASE_TEMPLATE.format(style=style, location_description="{location}"),
+                "mars_interior": self.MARS_INDOOR_TEMPLATE.format(style=style, location_description="{location}"),
+                "mars_exterior": self.MARS_OUTDOOR_TEMPLATE.format(style=style, location_description="{location}")
+            }
+            self._image_requirements[phase] = self.IMAGE_REQUIREMENTS.format(
+                rendering="Sketch-like artistic style with visible strokes" if phase == "early" else "Photorealistic with cinematic lighting"
+            )
+    
+    def get_style_phase(self, round_num: int) -> str:
+        """Determine style phase based on round number."""
+        return "early" if round_num <= 2 else "mature"
+    
+    def compact_state(self, state: Dict[str, Any]) -> str:
+        """
+        Serialize the state for the planner without its feedback history,
+        which is shown separately and windowed.
+        """
+        compact = {k: v for k, v in state.items() if k != "feedback_history"}
+        return json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+    
+    def build_planning_prompt(
+        self,
+        feedback: str,
+        state: Dict[str, Any],
+        user_images_description: Optional[str] = None
+    ) -> str:
+        """
+        Build the planning prompt for the LIVIN DNA Manager.
+        
+        Args:
+            feedback: User's current feedback/input
+            state: Current LIVIN DNA state
+            user_images_description: Optional description of uploaded images
+            
+        Returns:
+            Complete planning prompt string
+        """
+        current_round = state.get('round', 0) + 1
+        style_phase = self.get_style_phase(current_round)
+        style_config = self.STYLE_EVOLUTION[style_phase]
+        
+        # Build history context from the last few inputs, labelled with their real round
+        history_context = ""
+        history = state.get('feedback_history') or []
+        if history:
+            window = history[-self.HISTORY_WINDOW:]
+            first_round = len(history) - len(window) + 1
+            history_context = "Previous user inputs:\n" + "\n".join(
+                f"- Round {first_round + i}: {h}" for i, h in enumerate(window)
+            )
+        
+        parts = [
+            self.PLANNING_HEADER,
+            self.compact_state(state),
+            "\n\n",
+            history_context,
+            f'\n\nUser\'s New Input: "{feedback}"\n\n',
+            f"User uploaded images showing: {user_images_description}" if user_images_description else "",
+            f"\n\nCurrent Round: {current_round}\n",
+            f"Style Phase: {style_phase} ({style_config['ratio']})\n",
+            f"Include Human Characters: {style_config['include_characters']}\n\n",
+            self._planning_tasks[style_phase].replace("{current_round}", str(current_round))
+        ]
+        return "".join(parts)
+    
+    @staticmethod
+    def merge_feedback_history(state: Dict[str, Any], feedback: str, updated_state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return updated_state with the full feedback history restored.
+        The planner only sees a window of the history, so it is appended here.
+        """
+        merged = dict(updated_state)
+        merged["feedback_history"] = list(state.get("feedback_history") or []) + [feedback]
+        return merged
     
     def build_image_prompt(
         self,
@@ -191,54 +264,88 @@ Respond ONLY with valid JSON:
         Returns:
             Complete image generation prompt
         """
-        style_phase = self.get_style_phase(round_num)
-        style_config = self.STYLE_EVOLUTION[style_phase]
+        item = {"prompt": design_prompt, "environment": environment, "view": view}
+        location = {environment: location_description}
+        return self.build_image_prompts([item], round_num, livin_dna, location.get("earth"), location.get("mars"))[0]
+    
+    def build_image_prompts(
+        self,
+        items: List[Dict[str, Any]],
+        round_num: int,
+        livin_dna: List[str],
+        earth_location: Optional[str] = None,
+        mars_location: Optional[str] = None
+    ) -> List[str]:
+        """
+        Build the image prompts for several plan items in one pass.
         
-        # Choose style based on phase
-        if style_phase == "early":
-            style = "hand-drawn architectural concept sketch with soft watercolor touches"
-        else:
-            if style_config['include_characters']:
-                style = "cinematic photorealistic render with natural human figures in a lifestyle scene"
-            else:
-                style = "cinematic photorealistic architectural visualization"
+        Args:
+            items: Plan items with prompt, environment and optional view
+            round_num: Current round number
+            livin_dna: List of DNA keywords
+            earth_location: Optional Earth location context
+            mars_location: Optional Mars location context
+            
+        Returns:
+            One complete image generation prompt per item, in order
+        """
+        style_phase = self.get_style_phase(round_num)
+        bases = self._image_bases[style_phase]
+        requirements = self._image_requirements[style_phase]
+        locations = {
+            "earth": earth_location or self.DEFAULT_LOCATIONS["earth"],
+            "mars": mars_location or self.DEFAULT_LOCATIONS["mars"]
+        }
         
-        # Default location if not provided
-        if not location_description:
-            location_description = "a scenic location perfect for modular living" if environment == "earth" else "Jezero Crater region, Mars"
+        # Shared by every prompt in the round
+        dna_section = self._dna_section(livin_dna)
+        filled = {}
         
-        # Build base template
-        if environment == "earth":
-            base = self.EARTH_BASE_TEMPLATE.format(
-                style=style,
-                location_description=location_description
+        prompts = []
+        for item in items:
+            key = self.image_group(item)
+            if key not in filled:
+                filled[key] = bases[key].replace("{location}", locations[item["environment"]])
+            prompts.append(
+                f"{filled[key]}\n\nDesign Specifications: {item['prompt']}\n{dna_section}{requirements}"
             )
-        else:  # mars
-            if view == "interior":
-                base = self.MARS_INDOOR_TEMPLATE.format(
-                    style=style,
-                    location_description=location_description
-                )
-            else:
-                base = self.MARS_OUTDOOR_TEMPLATE.format(
-                    style=style,
-                    location_description=location_description
-                )
-        
-        # Combine with design prompt and DNA
-        dna_string = ", ".join(livin_dna) if livin_dna else "modern, flexible, aesthetic"
+        return prompts
+    
+    def build_batch_image_prompt(
+        self,
+        items: List[Dict[str, Any]],
+        round_num: int,
+        livin_dna: List[str],
+        earth_location: Optional[str] = None,
+        mars_location: Optional[str] = None
+    ) -> str:
+        """
+        Build one prompt asking for a separate image per plan item, for a
+        multi-output image call. Items must share an image_group.
         
-        full_prompt = f"""{base}
-
-Design Specifications: {design_prompt}
-
-LIVIN DNA Keywords: {dna_string}
-
-Technical Requirements:
-- High quality, detailed visualization
-- Consistent modular architecture language
-- {"Sketch-like artistic style with visible strokes" if style_phase == "early" else "Photorealistic with cinematic lighting"}
-- 16:9 aspect ratio composition
-- No text, logos, or watermarks
-"""
-        return full_prompt
+        Returns:
+            Combined prompt listing each item's design specifications in order
+        """
+        style_phase = self.get_style_phase(round_num)
+        environment = items[0]["environment"]
+        location = (earth_location if environment == "earth" else mars_location) or self.DEFAULT_LOCATIONS[environment]
+        base = self._image_bases[style_phase][self.image_group(items[0])].replace("{location}", location)
+        variants = "\n".join(
+            f"Image {i}: {item['prompt']}" for i, item in enumerate(items, start=1)
+        )
+        return (
+            f"{base}\n\nCreate {len(items)} separate images, one per design below, in this order. "
+            f"Each image shows only its own design.\n\nDesign Specifications:\n{variants}\n"
+            f"{self._dna_section(livin_dna)}{self._image_requirements[style_phase]}"
+        )
+    
+    @staticmethod
+    def image_group(item: Dict[str, Any]) -> str:
+        """Base template an item renders with ("earth", "mars_interior" or "mars_exterior")."""
+        if item["environment"] == "earth":
+            return "earth"
+        return "mars_interior" if item.get("view", "exterior") == "interior" else "mars_exterior"
+    
+    @staticmethod
+    def _dna_section(livin_dna: List[str]) -> str:
+        return "\nLIVIN DNA Keywords: " + (", ".join(livin_dna) if livin_dna else "modern, flexible, aesthetic") + "\n"
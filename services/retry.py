@@ -0,0 +1,254 @@
+"""
+Retry engine for Dream LIVIN Shop.
+Retries upstream calls with full-jitter backoff, honors Retry-After, limits
+retries per operation with a budget, and fails fast through a circuit
+breaker once the upstream error rate crosses a threshold.
+"""
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services import metrics, tracing
+from services.errors import UpstreamError, CircuitOpenError
+
+
+class RetryPolicy:
+    """
+    Per-operation retry limits.
+
+    Args:
+        max_attempts: Total attempts per call, including the first
+        base_delay: Backoff base in seconds
+        max_delay: Upper bound for a single wait
+        max_elapsed: Give up instead of waiting past this many seconds per call
+        budget_ratio: Retries allowed as a fraction of recent calls
+        budget_min: Retries always allowed per window regardless of ratio
+        budget_window: Window in seconds for the retry budget
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 2.0,
+        max_delay: float = 30.0,
+        max_elapsed: float = 120.0,
+        budget_ratio: float = 0.2,
+        budget_min: int = 10,
+        budget_window: float = 10.0
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.budget_window = budget_window
+        self._calls = deque()
+        self._retries = deque()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for a 0-based retry attempt."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _trim(self, now: float):
+        for events in (self._calls, self._retries):
+            while events and now - events[0] > self.budget_window:
+                events.popleft()
+
+    def record_call(self):
+        self._calls.append(time.monotonic())
+
+    def try_spend_retry(self) -> bool:
+        """Take one retry from the budget, or refuse when it is exhausted."""
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= self.budget_min + self.budget_ratio * len(self._calls):
+            return False
+        self._retries.append(now)
+        return True
+
+
+class CircuitBreaker:
+    """
+    Rolling-window error-rate breaker.
+
+    Closed: calls flow and outcomes are recorded.
+    Open: calls fail immediately with CircuitOpenError for open_seconds.
+    Half-open: one trial call decides between closing and re-opening.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: float = 0.5,
+        min_calls: int = 10,
+        window_seconds: float = 30.0,
+        open_seconds: float = 20.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self._outcomes = deque()  # (timestamp, failed)
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not reach upstream."""
+        if self.state == "closed":
+            return
+        now = time.monotonic()
+        remaining = self._opened_at + self.open_seconds - now
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        raise CircuitOpenError(self.name, retry_after=max(1.0, remaining))
+
+    def release_trial(self):
+        """Give up a half-open trial that ended without an upstream outcome."""
+        self._trial_in_flight = False
+
+    def record(self, failed: bool):
+        """Record the outcome of a call that reached upstream."""
+        now = time.monotonic()
+        if self.state == "half_open":
+            self._trial_in_flight = False
+            if failed:
+                self._open(now)
+            else:
+                self.state = "closed"
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append((now, failed))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+        if len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, f in self._outcomes if f)
+            if failures / len(self._outcomes) >= self.failure_threshold:
+                self._open(now)
+
+    def _open(self, now: float):
+        if self.state != "open":
+            print(f"Circuit '{self.name}' opened: upstream error rate too high")
+        self.state = "open"
+        self._opened_at = now
+        self._outcomes.clear()
+
+
+class RetryEngine:
+    """Runs upstream calls under per-operation retry policies and breakers."""
+
+    def __init__(self, policies: Dict[str, RetryPolicy], breakers: Dict[str, CircuitBreaker]):
+        self.policies = policies
+        self.breakers = breakers
+
+    async def call(self, operation: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Call func with retries for transient upstream errors.
+
+        Raises:
+            CircuitOpenError: When the operation's breaker is open
+            UpstreamError: When the error is permanent or retries are exhausted
+        """
+        policy = self.policies[operation]
+        breaker = self.breakers.get(operation)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        policy.record_call()
+
+        attempt = 0
+        while True:
+            if breaker:
+                breaker.before_call()
+            try:
+                with metrics.UPSTREAM_IN_FLIGHT.labels(operation).track_inprogress(), \
+                        metrics.UPSTREAM_SECONDS.labels(operation).time(), \
+                        tracing.span(f"upstream.{operation}", attempt=attempt + 1):
+                    result = await func(*args, **kwargs)
+            except UpstreamError as e:
+                metrics.UPSTREAM_ERRORS.labels(operation, str(e.status_code or "none")).inc()
+                if breaker:
+                    breaker.record(failed=e.retryable)
+                if not e.retryable or attempt + 1 >= policy.max_attempts:
+                    raise
+
+                delay = self._next_delay(policy, attempt, e.retry_after)
+                elapsed = loop.time() - started
+                if delay is None or elapsed + delay > policy.max_elapsed or not policy.try_spend_retry():
+                    raise
+                print(f"Upstream {operation} failed ({e}), retrying in {delay:.1f}s... "
+                      f"(Attempt {attempt + 1}/{policy.max_attempts})")
+                metrics.UPSTREAM_RETRIES.labels(operation).inc()
+                tracing.add_event("retry", operation=operation, attempt=attempt + 1,
+                                  delay=delay, error=str(e))
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except asyncio.CancelledError:
+                # Cancellation says nothing about upstream health; let the next call be the trial
+                if breaker and breaker.state == "half_open":
+                    breaker.release_trial()
+                raise
+            except BaseException:
+                if breaker and breaker.state == "half_open":
+                    breaker.record(failed=True)
+                raise
+
+            if breaker:
+                breaker.record(failed=False)
+            return result
+
+    @staticmethod
+    def _next_delay(policy: RetryPolicy, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        jittered = policy.backoff(attempt)
+        if retry_after is None:
+            return jittered
+        if retry_after > policy.max_delay:
+            return None
+        # Never retry sooner than upstream asked; add jitter to avoid lockstep
+        return retry_after + jittered * 0.25
+
+
+def create_retry_engine() -> RetryEngine:
+    """
+    Build the retry engine from environment configuration.
+
+    RETRY_<OP>_MAX_ATTEMPTS: Attempts per call for plan, image and transcribe
+    RETRY_BASE_DELAY / RETRY_MAX_DELAY / RETRY_MAX_ELAPSED: Backoff bounds in seconds
+    RETRY_BUDGET_RATIO: Retries allowed as a fraction of recent calls
+    CIRCUIT_FAILURE_THRESHOLD / CIRCUIT_MIN_CALLS / CIRCUIT_WINDOW_SECONDS /
+    CIRCUIT_OPEN_SECONDS: Circuit breaker tuning
+    """
+    defaults = {"plan": 3, "image": 3, "transcribe": 2}
+    base_delay = float(os.getenv("RETRY_BASE_DELAY", "2"))
+    max_delay = float(os.getenv("RETRY_MAX_DELAY", "30"))
+    max_elapsed = float(os.getenv("RETRY_MAX_ELAPSED", "120"))
+    budget_ratio = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+
+    policies = {}
+    breakers = {}
+    for operation, attempts in defaults.items():
+        policies[operation] = RetryPolicy(
+            max_attempts=int(os.getenv(f"RETRY_{operation.upper()}_MAX_ATTEMPTS", str(attempts))),
+            base_delay=base_delay,
+            max_delay=max_delay,
+            max_elapsed=max_elapsed,
+            budget_ratio=budget_ratio
+        )
+        breakers[operation] = CircuitBreaker(
+            operation,
+            failure_threshold=float(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "0.5")),
+            min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "10")),
+            window_seconds=float(os.getenv("CIRCUIT_WINDOW_SECONDS", "30")),
+            open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "20"))
+        )
+    return RetryEngine(policies, breakers)
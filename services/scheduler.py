@@ -0,0 +1,161 @@
+"""
+Generation scheduler for Dream LIVIN Shop.
+A fixed-size worker pool fed by a bounded FIFO queue, so traffic spikes
+wait in line (or get turned away) instead of fanning out to the upstream API.
+Jobs can be cancelled while waiting or running.
+"""
+import asyncio
+import math
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when the generation queue cannot accept another job."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Generation queue is full")
+        self.retry_after = retry_after
+
+
+class GenerationScheduler:
+    """
+    Runs generation jobs on a fixed number of workers.
+
+    Args:
+        workers: Number of jobs allowed to run concurrently
+        max_queue: Maximum number of jobs waiting for a worker
+        on_position: Optional async callback(job_id, position) invoked when a
+            job's place in line changes; position 0 means the job has started
+    """
+
+    # Initial guess for a job's duration before any job has finished
+    DEFAULT_JOB_SECONDS = 45.0
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queue: int = 50,
+        on_position: Optional[Callable[[str, int], Awaitable[None]]] = None
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.on_position = on_position
+        self._queue: Optional[asyncio.Queue] = None
+        self._waiting = OrderedDict()  # job_id -> None, in queue order
+        self._cancelled = set()  # Queued jobs cancelled before a worker took them
+        self._jobs: Dict[str, asyncio.Task] = {}  # Running jobs
+        self._workers = []
+        self._running = 0
+        self._avg_job_seconds = self.DEFAULT_JOB_SECONDS
+
+    async def start(self):
+        """Spawn the worker pool. Must run inside the event loop."""
+        if self._workers:
+            return
+        # Capacity is enforced on _waiting, so cancelled jobs free their slot at once
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel workers and any running jobs."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return len(self._waiting)
+
+    @property
+    def running(self) -> int:
+        """Number of jobs currently executing."""
+        return self._running
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a queue slot frees up."""
+        return max(1, math.ceil(self._avg_job_seconds / max(1, self.workers)))
+
+    def submit(self, job_id: str, func: Callable[..., Awaitable], *args) -> int:
+        """
+        Enqueue a job without blocking.
+
+        Returns:
+            The job's 1-based queue position
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        if self._queue is None:
+            raise RuntimeError("Scheduler has not been started")
+        if len(self._waiting) >= self.max_queue:
+            raise QueueFullError(self.retry_after())
+        self._queue.put_nowait((job_id, func, args))
+        self._waiting[job_id] = None
+        return len(self._waiting)
+
+    async def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a waiting or running job.
+
+        Returns:
+            "queued" if the job was removed from the queue, "running" if its
+            task was cancelled, or None if the scheduler does not know the job
+        """
+        if job_id in self._waiting:
+            del self._waiting[job_id]
+            self._cancelled.add(job_id)
+            for position, waiting_id in enumerate(list(self._waiting), start=1):
+                await self._notify(waiting_id, position)
+            return "queued"
+        job = self._jobs.get(job_id)
+        if job is not None and not job.done():
+            job.cancel()
+            return "running"
+        return None
+
+    async def _notify(self, job_id: str, position: int):
+        if self.on_position is None:
+            return
+        try:
+            await self.on_position(job_id, position)
+        except Exception as e:
+            print(f"Queue position update failed for {job_id}: {e}")
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, func, args = await self._queue.get()
+            if job_id in self._cancelled:
+                self._cancelled.discard(job_id)
+                self._queue.task_done()
+                continue
+            self._waiting.pop(job_id, None)
+            self._running += 1
+            started = loop.time()
+            # Run as its own task so cancelling the job leaves the worker alive;
+            # registered before any await so cancel() always finds it
+            job = asyncio.create_task(func(*args))
+            self._jobs[job_id] = job
+            try:
+                await self._notify(job_id, 0)
+                for position, waiting_id in enumerate(list(self._waiting), start=1):
+                    await self._notify(waiting_id, position)
+                try:
+                    await asyncio.wait({job})
+                except asyncio.CancelledError:
+                    job.cancel()
+                    raise
+                if job.cancelled():
+                    print(f"Generation job {job_id} cancelled")
+                elif job.exception() is not None:
+                    print(f"Generation job {job_id} crashed: {job.exception()}")
+            finally:
+                self._jobs.pop(job_id, None)
+                self._running -= 1
+                self._queue.task_done()
+                # Exponential moving average of job duration for Retry-After
+                elapsed = loop.time() - started
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
@@ -0,0 +1,154 @@
+"""
+Design sessions for Dream LIVIN Shop.
+Keeps each user's LIVIN DNA state on the server, versioned, so clients send
+a session id with their feedback or DNA edits and receive only what changed.
+"""
+import copy
+import uuid
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+from services.task_store import TaskStore
+
+
+DEFAULT_STATE = {
+    "round": 0,
+    "design_summary": "",
+    "livin_dna": [],
+    "confirmed_preferences": [],
+    "rejected_elements": [],
+    "feedback_history": []
+}
+
+
+class VersionConflictError(Exception):
+    """The client edited an older version of the session state."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Session state has changed (now at version {current_version})")
+        self.current_version = current_version
+
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """Apply an RFC 7386 JSON merge patch and return the result."""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def merge_patch_diff(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """RFC 7386 merge patch that turns old into new."""
+    patch = {key: None for key in old.keys() - new.keys()}
+    for key, value in new.items():
+        before = old.get(key)
+        if before == value:
+            continue
+        if isinstance(before, dict) and isinstance(value, dict):
+            patch[key] = merge_patch_diff(before, value)
+        else:
+            patch[key] = value
+    return patch
+
+
+def diff_state(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Describe how new differs from old.
+
+    Returns:
+        {"patch": merge patch, "append": {key: items}} where lists that only
+        grew at the end (such as feedback_history) are sent as appended items
+        instead of in full
+    """
+    patch = merge_patch_diff(old, new)
+    append = {}
+    for key, value in list(patch.items()):
+        before = old.get(key)
+        if isinstance(before, list) and isinstance(value, list) and value[:len(before)] == before:
+            append[key] = value[len(before):]
+            del patch[key]
+    return {"patch": patch, "append": append}
+
+
+class SessionManager:
+    """
+    Versioned session state on top of a TaskStore backend.
+
+    Records are {"id", "version", "state"}; every change bumps the version.
+    Writes are serialized per process, so read-modify-write cycles do not
+    interleave.
+    """
+
+    def __init__(self, store: TaskStore):
+        self.store = store
+        self._lock = asyncio.Lock()
+
+    async def create(self, state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Start a session, optionally seeded with an existing client state."""
+        record = {
+            "id": str(uuid.uuid4()),
+            "version": 1,
+            "state": apply_merge_patch(DEFAULT_STATE, state or {})
+        }
+        await self.store.create(record["id"], record)
+        return record
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(session_id)
+
+    async def update(
+        self,
+        session_id: str,
+        changes: Dict[str, Any],
+        expected_version: Optional[int] = None
+    ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Set top-level state fields in place.
+
+        Args:
+            changes: Fields to overwrite in the state
+            expected_version: Version the client based its edit on, if known
+
+        Returns:
+            (record, diff) or None if the session does not exist
+
+        Raises:
+            VersionConflictError: When expected_version is stale
+        """
+        async with self._lock:
+            record = await self.store.get(session_id)
+            if record is None:
+                return None
+            if expected_version is not None and expected_version != record["version"]:
+                raise VersionConflictError(record["version"])
+            new_state = dict(record["state"])
+            new_state.update(changes)
+            return await self._save(record, new_state)
+
+    async def replace(self, session_id: str, new_state: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Store a complete new state (e.g. a finished round) and return (record, diff)."""
+        async with self._lock:
+            record = await self.store.get(session_id)
+            if record is None:
+                return None
+            return await self._save(record, new_state)
+
+    async def _save(self, record: Dict[str, Any], new_state: Dict[str, Any]):
+        base_version = record["version"]
+        diff = diff_state(record["state"], new_state)
+        if diff["patch"] or diff["append"]:
+            record = await self.store.update(
+                record["id"],
+                {"version": base_version + 1, "state": new_state}
+            )
+            if record is None:
+                # Expired or evicted since it was read
+                return None
+        diff["base_version"] = base_version
+        diff["version"] = record["version"]
+        return record, diff
@@ -0,0 +1,72 @@
+"""
+Single-flight call coalescing for Dream LIVIN Shop.
+Concurrent callers asking for the same upstream request (same canonical key)
+share one in-flight call instead of each paying for a duplicate.
+"""
+import hashlib
+import json
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+def request_key(**parts) -> str:
+    """Canonical hash of the parts that define an upstream request."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; later callers await its result.
+
+    Every waiter receives the call's result or its exception. A waiter that
+    is cancelled leaves without affecting the others; when the last waiter
+    leaves, the shared call itself is cancelled.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._flights)}
+
+    async def run(self, key: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Call func(*args, **kwargs), or join the in-flight call with the same key.
+
+        Returns:
+            The shared call's result
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            self.calls += 1
+            flight = _Flight(asyncio.create_task(func(*args, **kwargs)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.shared += 1
+
+        flight.waiters += 1
+        try:
+            # Shielded so one waiter's cancellation does not cancel the call
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
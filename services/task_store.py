@@ -0,0 +1,241 @@
+"""
+Task store for Dream LIVIN Shop.
+Keeps generation task records bounded in size and age, either in-process
+(LRU/TTL) or in a SQLite file that several uvicorn workers can share.
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class TaskStore:
+    """Interface for task record storage. Records are JSON-serializable dicts."""
+
+    async def create(self, task_id: str, record: Dict[str, Any]):
+        """Store a new task record."""
+        raise NotImplementedError
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the task record, or None if missing/expired."""
+        raise NotImplementedError
+
+    async def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge fields into a task record and return the updated record."""
+        raise NotImplementedError
+
+    async def delete(self, task_id: str):
+        """Remove a task record if present."""
+        raise NotImplementedError
+
+    async def count(self) -> int:
+        """Number of live task records."""
+        raise NotImplementedError
+
+    async def close(self):
+        """Release backend resources."""
+        pass
+
+
+class MemoryTaskStore(TaskStore):
+    """
+    In-process store with a size cap and TTL.
+    Least recently touched records are evicted first.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 21600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._records = OrderedDict()  # task_id -> (touched_at, record)
+
+    def _expired(self, touched_at: float) -> bool:
+        return time.monotonic() - touched_at > self.ttl_seconds
+
+    def _prune(self):
+        # Oldest entries sit at the front, so stop at the first live one
+        while self._records:
+            touched_at, _ = next(iter(self._records.values()))
+            if not self._expired(touched_at) and len(self._records) <= self.max_entries:
+                break
+            self._records.popitem(last=False)
+
+    async def create(self, task_id: str, record: Dict[str, Any]):
+        self._records[task_id] = (time.monotonic(), dict(record))
+        self._records.move_to_end(task_id)
+        self._prune()
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._records.get(task_id)
+        if entry is None:
+            return None
+        if self._expired(entry[0]):
+            del self._records[task_id]
+            return None
+        return dict(entry[1])
+
+    async def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        entry = self._records.get(task_id)
+        if entry is None:
+            return None
+        record = entry[1]
+        record.update(fields)
+        self._records[task_id] = (time.monotonic(), record)
+        self._records.move_to_end(task_id)
+        return dict(record)
+
+    async def delete(self, task_id: str):
+        self._records.pop(task_id, None)
+
+    async def count(self) -> int:
+        self._prune()
+        return len(self._records)
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    File-backed store shared by every worker process pointing at the same path.
+    Queries run in a worker thread so they never block the event loop.
+    """
+
+    # Run the (relatively costly) eviction query once every N creates
+    PRUNE_EVERY = 50
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "tasks",
+        max_entries: int = 1000,
+        ttl_seconds: float = 21600
+    ):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._creates = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_updated_at ON {table}(updated_at)")
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def _create_sync(self, task_id: str, record: Dict[str, Any]):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (id, data, updated_at) VALUES (?, ?, ?)",
+            (task_id, json.dumps(record, ensure_ascii=False), time.time())
+        )
+        self._creates += 1
+        if self._creates % self.PRUNE_EVERY == 0:
+            self._prune_sync()
+
+    def _prune_sync(self):
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE updated_at < ?",
+            (time.time() - self.ttl_seconds,)
+        )
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE id NOT IN "
+            f"(SELECT id FROM {self.table} ORDER BY updated_at DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+    def _get_sync(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            f"SELECT data, updated_at FROM {self.table} WHERE id = ?", (task_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return json.loads(row[0])
+
+    def _update_sync(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            record = self._get_sync(task_id)
+            if record is None:
+                self._conn.execute("COMMIT")
+                return None
+            record.update(fields)
+            self._conn.execute(
+                f"UPDATE {self.table} SET data = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(record, ensure_ascii=False), time.time(), task_id)
+            )
+            self._conn.execute("COMMIT")
+            return record
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _delete_sync(self, task_id: str):
+        self._conn.execute(f"DELETE FROM {self.table} WHERE id = ?", (task_id,))
+
+    def _count_sync(self) -> int:
+        row = self._conn.execute(
+            f"SELECT COUNT(*) FROM {self.table} WHERE updated_at >= ?",
+            (time.time() - self.ttl_seconds,)
+        ).fetchone()
+        return row[0]
+
+    async def create(self, task_id: str, record: Dict[str, Any]):
+        await self._run(self._create_sync, task_id, record)
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_sync, task_id)
+
+    async def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._run(self._update_sync, task_id, fields)
+
+    async def delete(self, task_id: str):
+        await self._run(self._delete_sync, task_id)
+
+    async def count(self) -> int:
+        return await self._run(self._count_sync)
+
+    async def close(self):
+        await self._run(self._conn.close)
+
+
+def create_task_store(
+    table: str = "tasks",
+    default_path: Optional[str] = None,
+    max_entries: Optional[int] = None,
+    ttl_seconds: Optional[float] = None
+) -> TaskStore:
+    """
+    Build the task store selected by environment configuration.
+
+    TASK_STORE_BACKEND: "memory" (default) or "sqlite"
+    TASK_STORE_PATH: SQLite database file (shared between workers)
+    TASK_STORE_MAX_ENTRIES: Maximum number of records kept
+    TASK_TTL_SECONDS: Records untouched for longer than this are dropped
+
+    max_entries and ttl_seconds override the environment for other record
+    kinds (e.g. sessions) stored through the same backend.
+    """
+    backend = os.getenv("TASK_STORE_BACKEND", "memory").lower()
+    if max_entries is None:
+        max_entries = int(os.getenv("TASK_STORE_MAX_ENTRIES", "1000"))
+    if ttl_seconds is None:
+        ttl_seconds = float(os.getenv("TASK_TTL_SECONDS", "21600"))
+
+    if backend == "sqlite":
+        path = os.getenv("TASK_STORE_PATH") or default_path or "tasks.db"
+        return SQLiteTaskStore(path, table=table, max_entries=max_entries, ttl_seconds=ttl_seconds)
+    if backend != "memory":
+        raise ValueError(f"Unknown TASK_STORE_BACKEND: {backend}")
+    return MemoryTaskStore(max_entries=max_entries, ttl_seconds=ttl_seconds)
@@ -0,0 +1,114 @@
+"""
+Request-scoped tracing for Dream LIVIN Shop.
+Wraps OpenTelemetry so each generation task gets a root span with child
+spans for prompt building, planning, every image, upstream attempts and
+cleanup. Spans go to the console, a JSON-lines file or an OTLP collector.
+Without the OpenTelemetry SDK installed (or with TRACING_ENABLED unset)
+every span is a no-op.
+"""
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+except ImportError:  # opentelemetry-sdk is optional
+    trace = None
+
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "file")  # console, file or otlp
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "0.1"))
+
+_tracer = None
+_provider = None
+_trace_file = None
+
+
+def _create_exporter():
+    global _trace_file
+    if TRACING_EXPORTER == "otlp":
+        # Endpoint and headers come from the standard OTEL_EXPORTER_OTLP_* variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    _trace_file = open(TRACING_FILE, "a", encoding="utf-8")
+    return ConsoleSpanExporter(
+        out=_trace_file,
+        formatter=lambda span: span.to_json(indent=None) + "\n"
+    )
+
+
+def setup_tracing():
+    """Install the tracer provider (called once at startup)."""
+    global _tracer, _provider
+    if not TRACING_ENABLED:
+        return
+    if trace is None:
+        print("Tracing disabled: opentelemetry-sdk is not installed")
+        return
+
+    # Unsampled traces cost only a context object, cheap enough to leave on
+    sampler = ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO))
+    _provider = TracerProvider(
+        sampler=sampler,
+        resource=Resource.create({"service.name": "dream-livin-shop"})
+    )
+    _provider.add_span_processor(BatchSpanProcessor(_create_exporter()))
+    _tracer = _provider.get_tracer("dream_livin_shop")
+    print(f"Tracing enabled: {TRACING_EXPORTER} exporter, sample ratio {TRACING_SAMPLE_RATIO}")
+
+
+def shutdown_tracing():
+    """Flush pending spans and close the exporter."""
+    global _tracer, _provider, _trace_file
+    if _provider is not None:
+        _provider.shutdown()
+    if _trace_file is not None:
+        _trace_file.close()
+    _tracer = _provider = _trace_file = None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Run a block inside a span, as a child of the current span if any.
+
+    Args:
+        name: Span name
+        **attributes: Span attributes (None values are skipped)
+
+    Yields:
+        The span, or None when tracing is off
+    """
+    if _tracer is None:
+        yield None
+        return
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def add_event(name: str, **attributes):
+    """Record an event (such as a retry wait) on the current span."""
+    if _tracer is None:
+        return
+    current = trace.get_current_span()
+    if current.is_recording():
+        current.add_event(name, attributes={k: v for k, v in attributes.items() if v is not None})
+
+
+def current_trace_id() -> Optional[str]:
+    """Hex trace id of the current span if it is sampled, to look a task up later."""
+    if _tracer is None:
+        return None
+    context = trace.get_current_span().get_span_context()
+    if not context.is_valid or not context.trace_flags.sampled:
+        return None
+    return format(context.trace_id, "032x")
@@ -0,0 +1,144 @@
+"""
+Upload processing for Dream LIVIN Shop.
+Spools user images to disk, downscales them to the resolution the planner
+needs and deduplicates them by content hash, so requests carry file paths
+instead of base64 strings held in memory for the whole task.
+"""
+import os
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from typing import BinaryIO, List, Optional
+
+from services.image_index import ImageIndex
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Without Pillow uploads are stored unscaled
+    Image = None
+    ImageOps = None
+
+
+CHUNK_SIZE = 1024 * 1024
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+    ".heic": "image/heic",
+}
+
+
+def media_type_for(path: str) -> str:
+    """MIME type for a prepared upload, based on its extension."""
+    return MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), "image/jpeg")
+
+
+def upload_digest(path: str) -> str:
+    """Content hash of a prepared upload (its filename stem)."""
+    return os.path.basename(path).split(".", 1)[0]
+
+
+class UploadProcessor:
+    """
+    Turns UploadFile objects into deduplicated, planner-sized files on disk.
+
+    Args:
+        directory: Where prepared uploads are kept
+        max_side: Longest edge after downscaling
+        max_count: Number of prepared uploads retained (oldest evicted first)
+    """
+
+    def __init__(self, directory: str, max_side: int = 1024, max_count: int = 1000):
+        self.directory = directory
+        self.max_side = max_side
+        self.index = ImageIndex(directory, max_count=max_count)
+        os.makedirs(directory, exist_ok=True)
+
+    async def load(self):
+        """Index uploads kept from a previous run."""
+        await self.index.load()
+
+    async def prepare(self, uploads: List[BinaryIO], content_types: List[Optional[str]]) -> List[str]:
+        """
+        Prepare several uploads, dropping duplicates.
+
+        Returns:
+            Paths of the prepared images, in upload order
+        """
+        paths = []
+        for upload, content_type in zip(uploads, content_types):
+            path, size = await asyncio.to_thread(self._prepare_sync, upload, content_type)
+            if path in paths:
+                continue
+            paths.append(path)
+            await self.index.remove(self.index.add(os.path.basename(path), size))
+        return paths
+
+    def _prepare_sync(self, upload: BinaryIO, content_type: Optional[str]):
+        # Hash while spooling to a temp file so the upload is never fully in memory
+        digest = hashlib.sha256()
+        upload.seek(0)
+        fd, tmp_path = tempfile.mkstemp(suffix=".upload")
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        key = digest.hexdigest()
+        try:
+            existing = self._existing(key)
+            if existing:
+                os.utime(existing)
+                return existing, os.path.getsize(existing)
+
+            if Image is not None:
+                path = os.path.join(self.directory, f"{key}.jpg")
+                try:
+                    self._downscale(tmp_path, path)
+                    return path, os.path.getsize(path)
+                except Exception as e:
+                    print(f"Could not downscale upload {key}, keeping original: {e}")
+
+            ext = {v: k for k, v in MEDIA_TYPES.items()}.get(content_type or "", ".jpg")
+            path = os.path.join(self.directory, f"{key}{ext}")
+            shutil.move(tmp_path, path)
+            return path, os.path.getsize(path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _existing(self, key: str) -> Optional[str]:
+        for ext in MEDIA_TYPES:
+            path = os.path.join(self.directory, f"{key}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _downscale(self, source_path: str, path: str):
+        with Image.open(source_path) as img:
+            # Let JPEG decode at reduced scale instead of full resolution
+            img.draft("RGB", (self.max_side, self.max_side))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((self.max_side, self.max_side))
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            # Unique per call: identical uploads may be downscaled concurrently
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=self.directory)
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    img.save(tmp, format="JPEG", quality=85)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
@@ -0,0 +1,103 @@
+"""Tests for voice-note chunking and transcript stitching."""
+import asyncio
+import io
+import wave
+
+import pytest
+
+from services.audio import AudioChunk, AudioPipeline, stitch, transcribe_chunks
+
+
+def test_stitch_drops_words_repeated_across_the_overlap():
+    texts = ["I want a small cabin near the", "near the lake with big windows"]
+
+    assert stitch(texts) == "I want a small cabin near the lake with big windows"
+
+
+def test_stitch_ignores_case_and_punctuation_in_the_overlap():
+    assert stitch(["a wooden deck, facing", "Deck facing south."]) == "a wooden deck, facing south."
+
+
+def test_stitch_keeps_the_longest_overlap():
+    assert stitch(["one two one two", "one two one two three"]) == "one two one two three"
+
+
+def test_stitch_without_overlap_joins_texts():
+    assert stitch(["solar roof", "green walls"]) == "solar roof green walls"
+
+
+def test_stitch_skips_empty_chunks():
+    assert stitch(["", "quiet room", "  ", "room with plants"]) == "quiet room with plants"
+
+
+def test_split_makes_overlapping_wav_chunks():
+    pipeline = AudioPipeline(ffmpeg_path=None, sample_rate=100, chunk_seconds=1, overlap_seconds=0.2)
+    pcm = bytes(range(256)) * 2  # 256 16-bit samples = 2.56 s
+
+    chunks = pipeline._split(pcm)
+
+    frames = []
+    for chunk in chunks:
+        with wave.open(io.BytesIO(chunk.data)) as wav:
+            assert (wav.getnchannels(), wav.getframerate()) == (1, 100)
+            frames.append(wav.readframes(wav.getnframes()))
+    assert [chunk.index for chunk in chunks] == [0, 1, 2]
+    assert [len(f) // 2 for f in frames] == [100, 100, 96]
+    # Each chunk starts 0.2 s before the previous one ends
+    assert frames[1][:40] == frames[0][-40:]
+    assert b"".join([frames[0]] + [f[40:] for f in frames[1:]]) == pcm
+
+
+def test_overlap_is_capped_at_half_a_chunk():
+    assert AudioPipeline(ffmpeg_path=None, chunk_seconds=4, overlap_seconds=10).overlap_seconds == 2
+
+
+def test_without_ffmpeg_the_recording_is_sent_as_is():
+    pipeline = AudioPipeline(ffmpeg_path=None)
+
+    chunks = asyncio.run(pipeline.prepare(io.BytesIO(b"webm"), "note.webm", "audio/webm"))
+
+    assert [(c.data, c.filename, c.content_type) for c in chunks] == [(b"webm", "note.webm", "audio/webm")]
+
+
+def test_transcribe_chunks_reports_progress_in_order():
+    texts = ["build a home", "a home on mars"]
+    chunks = [AudioChunk(i, b"", f"chunk_{i}.wav", "audio/wav") for i in range(2)]
+
+    async def transcribe(chunk):
+        # The second chunk finishes first
+        await asyncio.sleep(0.02 if chunk.index == 0 else 0)
+        return {"text": texts[chunk.index], "confidence": 0.5 + chunk.index / 4, "detected_language": "en"}
+
+    async def scenario():
+        return [event async for event in transcribe_chunks(chunks, transcribe)]
+
+    events = asyncio.run(scenario())
+
+    assert events[0] == ("partial", {"text": "", "chunks_done": 1, "chunks_total": 2})
+    assert events[1] == ("partial", {"text": "build a home on mars", "chunks_done": 2, "chunks_total": 2})
+    assert events[2] == ("completed", {"text": "build a home on mars", "language": "en", "confidence": 0.625})
+
+
+def test_transcribe_chunks_cancels_the_rest_on_failure():
+    cancelled = []
+    chunks = [AudioChunk(i, b"", f"chunk_{i}.wav", "audio/wav") for i in range(2)]
+
+    async def transcribe(chunk):
+        if chunk.index == 0:
+            raise RuntimeError("upstream down")
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(chunk.index)
+            raise
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async for _ in transcribe_chunks(chunks, transcribe):
+                pass
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert cancelled == [1]
@@ -0,0 +1,136 @@
+"""Tests for latency-percentile request hedging."""
+import asyncio
+
+from services.hedging import Hedger
+
+
+def make_hedger(**kwargs):
+    options = {"percentile": 50, "min_samples": 5, "max_hedge_rate": 1.0, "min_delay": 0.01}
+    options.update(kwargs)
+    return Hedger(**options)
+
+
+async def warm_up(hedger, count=5):
+    async def fast():
+        return "warm"
+
+    for _ in range(count):
+        await hedger.run(fast)
+
+
+def test_hedge_delay_needs_min_samples():
+    hedger = make_hedger()
+    hedger._latencies.extend([0.5] * 4)
+    assert hedger.hedge_delay() is None
+
+    hedger._latencies.append(0.5)
+    assert hedger.hedge_delay() == 0.5
+
+
+def test_hedge_delay_uses_percentile_and_min_delay():
+    hedger = make_hedger(percentile=90, min_samples=1, min_delay=0.2)
+    hedger._latencies.extend([0.1] * 9 + [3.0])
+    assert hedger.hedge_delay() == 3.0
+
+    hedger = make_hedger(percentile=50, min_samples=1, min_delay=0.2)
+    hedger._latencies.extend([0.1] * 10)
+    assert hedger.hedge_delay() == 0.2
+
+
+def test_fast_calls_are_not_hedged():
+    async def scenario():
+        hedger = make_hedger()
+        await warm_up(hedger, 10)
+        return hedger
+
+    hedger = asyncio.run(scenario())
+
+    assert hedger.calls == 10
+    assert hedger.hedges == 0
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins():
+    attempts = []
+
+    async def call():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                attempts.append("primary cancelled")
+                raise
+            return "primary"
+        return "hedge"
+
+    async def scenario():
+        hedger = make_hedger()
+        await warm_up(hedger)
+        result = await hedger.run(call)
+        await asyncio.sleep(0)
+        return hedger, result
+
+    hedger, result = asyncio.run(scenario())
+
+    assert result == "hedge"
+    assert "primary cancelled" in attempts
+    assert (hedger.hedges, hedger.hits, hedger.wasted) == (1, 1, 0)
+
+
+def test_original_can_still_win_after_hedging():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(0.05)
+            return "primary"
+        await asyncio.sleep(1)
+        return "hedge"
+
+    async def scenario():
+        hedger = make_hedger()
+        await warm_up(hedger)
+        return hedger, await hedger.run(call)
+
+    hedger, result = asyncio.run(scenario())
+
+    assert result == "primary"
+    assert (hedger.hedges, hedger.hits, hedger.wasted) == (1, 0, 1)
+
+
+def test_first_failure_waits_for_the_other_call():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(0.05)
+            return "primary"
+        raise ValueError("hedge failed")
+
+    async def scenario():
+        hedger = make_hedger()
+        await warm_up(hedger)
+        return await hedger.run(call)
+
+    assert asyncio.run(scenario()) == "primary"
+
+
+def test_hedge_rate_is_capped():
+    async def slow():
+        await asyncio.sleep(0.03)
+        return "slow"
+
+    async def scenario():
+        hedger = make_hedger(max_hedge_rate=0.1)
+        await warm_up(hedger, 8)
+        for _ in range(3):
+            await hedger.run(slow)
+        return hedger
+
+    hedger = asyncio.run(scenario())
+
+    # After 8 unhedged calls one hedge fits under 10%; the next two would exceed it
+    assert hedger.calls == 11
+    assert hedger.hedges == 1
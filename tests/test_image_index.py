@@ -0,0 +1,80 @@
+"""Tests for the incremental image index."""
+import asyncio
+import os
+
+from services.image_index import ImageIndex, image_stem
+
+
+def test_derivatives_share_the_original_stem():
+    assert image_stem("abc.png") == image_stem("abc.thumb.webp") == "abc"
+
+
+def test_add_within_limits_evicts_nothing():
+    index = ImageIndex("unused", max_count=2)
+
+    assert index.add("a.png", 10) == []
+    assert index.add("b.png", 10) == []
+    assert index.total_bytes == 20
+    assert "a.png" in index
+
+
+def test_count_limit_evicts_oldest_image_with_its_derivatives():
+    index = ImageIndex("unused", max_count=2)
+    index.add("a.png", 10)
+    index.add("a.webp", 4)
+    index.add("b.png", 10)
+
+    victims = index.add("c.png", 10)
+
+    assert sorted(victims) == ["a.png", "a.webp"]
+    assert "a.png" not in index and "c.png" in index
+    assert index.total_bytes == 20
+
+
+def test_derivatives_do_not_count_as_images():
+    index = ImageIndex("unused", max_count=1)
+    index.add("a.png", 10)
+
+    assert index.add("a.thumb.webp", 2) == []
+    assert index.add("a.webp", 4) == []
+
+
+def test_byte_limit_evicts_until_under_budget():
+    index = ImageIndex("unused", max_count=0, max_bytes=25)
+    index.add("a.png", 10)
+    index.add("b.png", 10)
+
+    victims = index.add("c.png", 10)
+
+    assert victims == ["a.png"]
+    assert index.total_bytes == 20
+
+
+def test_re_adding_a_file_replaces_its_size():
+    index = ImageIndex("unused", max_count=0, max_bytes=100)
+    index.add("a.png", 10)
+    index.add("a.png", 30)
+
+    assert index.total_bytes == 30
+
+
+def test_load_rebuilds_from_disk_and_trims(tmp_path):
+    for name in ("a.png", "a.webp", "b.png", "c.png"):
+        (tmp_path / name).write_bytes(b"x" * 5)
+    index = ImageIndex(str(tmp_path), max_count=2)
+
+    asyncio.run(index.load())
+
+    # "a" was written first, so it goes along with its derivative
+    assert sorted(os.listdir(tmp_path)) == ["b.png", "c.png"]
+    assert index.total_bytes == 10
+    assert "b.png" in index
+
+
+def test_remove_ignores_missing_files(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"x")
+    index = ImageIndex(str(tmp_path))
+
+    asyncio.run(index.remove(["a.png", "gone.png"]))
+
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,108 @@
+"""Tests for the incremental planning-response parser."""
+import json
+
+import pytest
+
+from services.plan_stream import PlanStreamParser
+
+
+PLAN = {
+    "updated_state": {
+        "round": 2,
+        "livin_dna": ["timber", "solar"],
+        "feedback_history": [{"round": 1, "feedback": "more {light}"}]
+    },
+    "plan": [
+        {"name": "earth_0", "environment": "earth", "prompt": "A \"cozy\" cabin, {warm} light \\ wood"},
+        {
+            "name": "mars_0",
+            "environment": "mars",
+            "prompt": "Dome",
+            "details": {"materials": {"shell": "regolith", "ribs": ["steel", "carbon"]}, "levels": [1, 2]}
+        }
+    ]
+}
+
+
+def feed_all(parser, chunks):
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return events
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_chunk_boundaries_do_not_matter(chunk_size):
+    text = json.dumps(PLAN, indent=2)
+    parser = PlanStreamParser()
+
+    events = feed_all(parser, [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)])
+
+    assert events == [
+        ("updated_state", PLAN["updated_state"]),
+        ("plan_item", PLAN["plan"][0]),
+        ("plan_item", PLAN["plan"][1])
+    ]
+    assert parser.updated_state == PLAN["updated_state"]
+    assert parser.plan == PLAN["plan"]
+    assert parser.result() == PLAN
+
+
+def test_escaped_quotes_and_braces_inside_strings():
+    parser = PlanStreamParser()
+    text = json.dumps({"updated_state": {}, "plan": [PLAN["plan"][0]]})
+    split = text.index("\\\"cozy") + 1  # between the backslash and the quote
+
+    events = parser.feed(text[:split]) + parser.feed(text[split:])
+
+    assert events[-1] == ("plan_item", PLAN["plan"][0])
+    assert len(events) == 2
+
+
+def test_nested_objects_yield_one_item_each():
+    parser = PlanStreamParser()
+
+    events = parser.feed(json.dumps({"plan": PLAN["plan"]}))
+
+    assert [value for kind, value in events if kind == "plan_item"] == PLAN["plan"]
+    assert parser.updated_state is None
+
+
+def test_plan_before_updated_state():
+    parser = PlanStreamParser()
+
+    events = parser.feed(json.dumps({"plan": PLAN["plan"][:1], "updated_state": {"round": 3}}))
+
+    assert events == [("plan_item", PLAN["plan"][0]), ("updated_state", {"round": 3})]
+
+
+def test_items_are_reported_as_soon_as_they_close():
+    parser = PlanStreamParser()
+    text = json.dumps({"updated_state": {}, "plan": PLAN["plan"]})
+    first_end = text.rindex("}", 0, text.index("mars_0")) + 1
+
+    assert parser.feed(text[:first_end]) == [("updated_state", {}), ("plan_item", PLAN["plan"][0])]
+    assert parser.feed(text[first_end:]) == [("plan_item", PLAN["plan"][1])]
+
+
+def test_other_top_level_keys_are_ignored():
+    parser = PlanStreamParser()
+
+    events = parser.feed(json.dumps({"notes": {"plan": [{"x": 1}]}, "plan": [{"name": "a"}]}))
+
+    assert events == [("plan_item", {"name": "a"})]
+
+
+def test_result_tolerates_text_around_the_object():
+    parser = PlanStreamParser()
+    parser.feed("```json\n" + json.dumps(PLAN) + "\n```")
+
+    assert parser.result() == PLAN
+
+
+def test_result_without_object_raises():
+    parser = PlanStreamParser()
+    parser.feed("no json here")
+
+    with pytest.raises(json.JSONDecodeError):
+        parser.result()
@@ -0,0 +1,73 @@
+"""Tests for precomputed image prompt sections."""
+import pytest
+
+from services.prompt_engine import PromptEngine
+
+
+ITEMS = [
+    {"prompt": "Timber cabin by a lake", "environment": "earth", "view": "exterior"},
+    {"prompt": "Dome with {curly} braces", "environment": "mars", "view": "exterior"},
+    {"prompt": "Hydroponic kitchen", "environment": "mars", "view": "interior"},
+    {"prompt": "Split-level home", "environment": "mars"},
+    {"prompt": "Treehouse", "environment": "earth", "view": "both"},
+]
+
+
+def reference_prompt(engine, item, round_num, livin_dna, location=""):
+    """Image prompt as it was formatted per item before sections were precomputed."""
+    environment, view = item["environment"], item.get("view", "exterior")
+    if engine.get_style_phase(round_num) == "early":
+        style = "hand-drawn architectural concept sketch with soft watercolor touches"
+        finish = "Sketch-like artistic style with visible strokes"
+    else:
+        style = "cinematic photorealistic render with natural human figures in a lifestyle scene"
+        finish = "Photorealistic with cinematic lighting"
+    if not location:
+        location = "a scenic location perfect for modular living" if environment == "earth" else "Jezero Crater region, Mars"
+    if environment == "earth":
+        template = engine.EARTH_BASE_TEMPLATE
+    elif view == "interior":
+        template = engine.MARS_INDOOR_TEMPLATE
+    else:
+        template = engine.MARS_OUTDOOR_TEMPLATE
+    base = template.format(style=style, location_description=location)
+    dna = ", ".join(livin_dna) if livin_dna else "modern, flexible, aesthetic"
+    return f"""{base}
+
+Design Specifications: {item['prompt']}
+
+LIVIN DNA Keywords: {dna}
+
+Technical Requirements:
+- High quality, detailed visualization
+- Consistent modular architecture language
+- {finish}
+- 16:9 aspect ratio composition
+- No text, logos, or watermarks
+"""
+
+
+@pytest.mark.parametrize("round_num", [1, 2, 3, 7])
+@pytest.mark.parametrize("livin_dna", [[], ["timber", "solar"]])
+def test_batch_prompts_match_the_per_item_format(round_num, livin_dna):
+    engine = PromptEngine()
+
+    prompts = engine.build_image_prompts(ITEMS, round_num, livin_dna)
+
+    assert prompts == [reference_prompt(engine, item, round_num, livin_dna) for item in ITEMS]
+
+
+@pytest.mark.parametrize("round_num", [1, 4])
+def test_single_prompt_matches_batch_prompt(round_num):
+    engine = PromptEngine()
+    locations = {"earth": "Lakeside {north} shore", "mars": "Olympus Mons"}
+
+    batch = engine.build_image_prompts(ITEMS, round_num, ["stone"], locations["earth"], locations["mars"])
+
+    for item, prompt in zip(ITEMS, batch):
+        location = locations[item["environment"]]
+        single = engine.build_image_prompt(
+            item["prompt"], item["environment"], item.get("view", "exterior"), round_num, ["stone"], location
+        )
+        assert single == prompt == reference_prompt(engine, item, round_num, ["stone"], location)
+
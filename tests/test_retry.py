@@ -0,0 +1,177 @@
+"""Tests for the retry engine and circuit breaker."""
+import asyncio
+import types
+
+import pytest
+
+from services.errors import CircuitOpenError, UpstreamError, UpstreamOverloadedError
+from services.retry import CircuitBreaker, RetryEngine, RetryPolicy
+
+
+def make_engine(policy=None, breaker=None):
+    policy = policy or RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01)
+    breakers = {"image": breaker} if breaker else {}
+    return RetryEngine({"image": policy}, breakers)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Breaker clock under test control; the event loop keeps real time."""
+    now = [100.0]
+    monkeypatch.setattr("services.retry.time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def flaky(failures, error=None):
+    """Async callable failing `failures` times before returning "ok"."""
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error or UpstreamOverloadedError(status_code=503)
+        return "ok"
+
+    return call, calls
+
+
+def test_retries_transient_errors_until_success():
+    call, calls = flaky(2)
+
+    assert asyncio.run(make_engine().call("image", call)) == "ok"
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_attempts():
+    call, calls = flaky(5)
+
+    with pytest.raises(UpstreamOverloadedError):
+        asyncio.run(make_engine().call("image", call))
+    assert len(calls) == 3
+
+
+def test_permanent_errors_are_not_retried():
+    call, calls = flaky(1, UpstreamError("bad request", status_code=400))
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(make_engine().call("image", call))
+    assert len(calls) == 1
+
+
+def test_retry_after_beyond_max_delay_is_not_waited_for():
+    call, calls = flaky(1, UpstreamOverloadedError(status_code=429, retry_after=60))
+
+    with pytest.raises(UpstreamOverloadedError):
+        asyncio.run(make_engine().call("image", call))
+    assert len(calls) == 1
+
+
+def test_retry_after_sets_the_minimum_wait():
+    policy = RetryPolicy(base_delay=0.001, max_delay=1)
+    assert RetryEngine._next_delay(policy, 0, 0.05) >= 0.05
+    assert 0 <= RetryEngine._next_delay(policy, 0, None) <= 0.001
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=2)
+    assert all(0 <= policy.backoff(attempt) <= 2 for attempt in range(10))
+
+
+def test_exhausted_budget_stops_retries():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, budget_ratio=0, budget_min=1)
+    engine = make_engine(policy)
+
+    first, first_calls = flaky(1)
+    second, second_calls = flaky(1)
+
+    assert asyncio.run(engine.call("image", first)) == "ok"
+    with pytest.raises(UpstreamOverloadedError):
+        asyncio.run(engine.call("image", second))
+    assert (len(first_calls), len(second_calls)) == (2, 1)
+
+
+def test_breaker_opens_and_rejects_calls():
+    breaker = CircuitBreaker("image", failure_threshold=0.5, min_calls=4, open_seconds=60)
+    for failed in (False, True, True, True):
+        breaker.record(failed)
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after > 0
+    assert not excinfo.value.retryable
+
+
+def test_breaker_stays_closed_below_min_calls():
+    breaker = CircuitBreaker("image", failure_threshold=0.5, min_calls=4)
+    for _ in range(3):
+        breaker.record(True)
+
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_half_open_allows_one_trial(clock):
+    breaker = CircuitBreaker("image", min_calls=1, open_seconds=10)
+    breaker.record(True)
+    assert breaker.state == "open"
+
+    clock[0] += 11
+    breaker.before_call()  # the trial
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker("image", min_calls=1, open_seconds=10)
+    breaker.record(True)
+
+    clock[0] += 11
+    breaker.before_call()
+    breaker.record(True)
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_cancelled_trial_does_not_reopen(clock):
+    breaker = CircuitBreaker("image", min_calls=1, open_seconds=10)
+    breaker.record(True)
+    clock[0] += 11
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        trial = asyncio.create_task(make_engine(breaker=breaker).call("image", hang))
+        await asyncio.sleep(0.01)
+        assert breaker.state == "half_open"
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(scenario())
+
+    assert breaker.state == "half_open"
+    breaker.before_call()  # the next call becomes the trial
+
+
+def test_engine_records_each_attempt_in_the_breaker():
+    breaker = CircuitBreaker("image", failure_threshold=0.5, min_calls=3, open_seconds=60)
+    call, calls = flaky(5)
+
+    with pytest.raises(UpstreamOverloadedError):
+        asyncio.run(make_engine(breaker=breaker).call("image", call))
+    assert len(calls) == 3
+    assert breaker.state == "open"
+
+    # Open breaker fails fast without reaching upstream
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(make_engine(breaker=breaker).call("image", call))
+    assert len(calls) == 3
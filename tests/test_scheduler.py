@@ -0,0 +1,173 @@
+"""Tests for the bounded generation queue."""
+import asyncio
+
+import pytest
+
+from services.scheduler import GenerationScheduler, QueueFullError
+
+
+async def started(workers=1, max_queue=2):
+    """A running scheduler that records position updates."""
+    positions = []
+
+    async def on_position(job_id, position):
+        positions.append((job_id, position))
+
+    scheduler = GenerationScheduler(workers=workers, max_queue=max_queue, on_position=on_position)
+    await scheduler.start()
+    return scheduler, positions
+
+
+def test_submit_before_start_raises():
+    with pytest.raises(RuntimeError):
+        GenerationScheduler().submit("a", asyncio.sleep, 0)
+
+
+def test_jobs_run_in_order_on_the_workers():
+    done = []
+
+    async def job(name):
+        await asyncio.sleep(0.01)
+        done.append(name)
+
+    async def scenario():
+        scheduler, _ = await started(workers=1, max_queue=5)
+        for name in "abc":
+            scheduler.submit(name, job, name)
+        await scheduler._queue.join()
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert done == ["a", "b", "c"]
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario():
+        scheduler, _ = await started(workers=1, max_queue=2)
+        release = asyncio.Event()
+        scheduler.submit("running", release.wait)
+        await asyncio.sleep(0.01)
+        positions = [scheduler.submit(name, release.wait) for name in ("first", "second")]
+        try:
+            with pytest.raises(QueueFullError) as excinfo:
+                scheduler.submit("third", release.wait)
+            return positions, scheduler.queued, scheduler.running, excinfo.value
+        finally:
+            await scheduler.stop()
+
+    positions, queued, running, error = asyncio.run(scenario())
+
+    assert positions == [1, 2]
+    assert (queued, running) == (2, 1)
+    assert error.retry_after >= 1
+
+
+def test_waiting_jobs_hear_their_new_position():
+    async def scenario():
+        scheduler, positions = await started(workers=1, max_queue=5)
+        release = asyncio.Event()
+        for name in ("a", "b", "c"):
+            scheduler.submit(name, release.wait)
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return positions
+
+    positions = asyncio.run(scenario())
+
+    # "a" starts, and the two behind it move up
+    assert positions == [("a", 0), ("b", 1), ("c", 2)]
+
+
+def test_crashing_job_keeps_the_worker():
+    done = []
+
+    async def crash():
+        raise ValueError("boom")
+
+    async def ok():
+        done.append("ok")
+
+    async def scenario():
+        scheduler, _ = await started(workers=1)
+        scheduler.submit("crash", crash)
+        scheduler.submit("ok", ok)
+        await scheduler._queue.join()
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert done == ["ok"]
+
+
+
+def test_cancelling_a_queued_job_frees_its_slot():
+    ran = []
+
+    async def job(name):
+        ran.append(name)
+
+    async def scenario():
+        scheduler, positions = await started(workers=1, max_queue=2)
+        release = asyncio.Event()
+        scheduler.submit("running", release.wait)
+        await asyncio.sleep(0.01)
+        scheduler.submit("dropped", job, "dropped")
+        scheduler.submit("kept", job, "kept")
+        outcome = await scheduler.cancel("dropped")
+        moved_up = positions[-1]
+        # The freed slot takes a new job at once
+        scheduler.submit("late", job, "late")
+        release.set()
+        await scheduler._queue.join()
+        await scheduler.stop()
+        return outcome, moved_up
+
+    outcome, moved_up = asyncio.run(scenario())
+
+    assert outcome == "queued"
+    assert moved_up == ("kept", 1)
+    assert ran == ["kept", "late"]
+
+
+def test_cancelling_a_running_job_keeps_the_worker():
+    events = []
+
+    async def hang():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+    async def job():
+        events.append("next")
+
+    async def scenario():
+        scheduler, _ = await started(workers=1)
+        scheduler.submit("hang", hang)
+        scheduler.submit("next", job)
+        await asyncio.sleep(0.01)
+        outcome = await scheduler.cancel("hang")
+        await scheduler._queue.join()
+        await scheduler.stop()
+        return outcome, scheduler.running
+
+    outcome, running = asyncio.run(scenario())
+
+    assert outcome == "running"
+    assert running == 0
+    assert events == ["cancelled", "next"]
+
+
+def test_cancelling_an_unknown_job_returns_none():
+    async def scenario():
+        scheduler, _ = await started()
+        scheduler.submit("finished", asyncio.sleep, 0)
+        await scheduler._queue.join()
+        try:
+            return await scheduler.cancel("missing"), await scheduler.cancel("finished")
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(scenario()) == (None, None)
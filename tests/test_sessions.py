@@ -0,0 +1,131 @@
+"""Tests for session state diffs and versioned updates."""
+import asyncio
+
+import pytest
+
+from services.sessions import (
+    SessionManager,
+    VersionConflictError,
+    apply_merge_patch,
+    diff_state,
+)
+from services.task_store import MemoryTaskStore
+
+
+OLD = {
+    "round": 1,
+    "design_summary": "Timber cabin",
+    "livin_dna": ["timber", "solar"],
+    "feedback_history": [{"round": 1, "feedback": "warm"}],
+    "meta": {"earth": {"site": "lake"}, "mars": {"site": "crater"}}
+}
+
+
+def apply(state, diff):
+    """What a client does with a diff from diff_state."""
+    result = apply_merge_patch(state, diff["patch"])
+    for key, items in diff["append"].items():
+        result[key] = list(result.get(key) or []) + list(items)
+    return result
+
+
+def test_unchanged_state_has_empty_diff():
+    assert diff_state(OLD, dict(OLD)) == {"patch": {}, "append": {}}
+
+
+def test_grown_list_is_sent_as_appended_items():
+    new = dict(OLD, feedback_history=OLD["feedback_history"] + [{"round": 2, "feedback": "taller"}])
+
+    diff = diff_state(OLD, new)
+
+    assert diff == {"patch": {}, "append": {"feedback_history": [{"round": 2, "feedback": "taller"}]}}
+
+
+def test_rewritten_list_is_sent_in_full():
+    new = dict(OLD, livin_dna=["stone", "solar"])
+
+    assert diff_state(OLD, new) == {"patch": {"livin_dna": ["stone", "solar"]}, "append": {}}
+
+
+def test_removed_key_is_null_in_patch():
+    new = {key: value for key, value in OLD.items() if key != "design_summary"}
+
+    assert diff_state(OLD, new)["patch"] == {"design_summary": None}
+
+
+def test_nested_dicts_diff_only_changed_fields():
+    new = dict(OLD, meta={"earth": {"site": "forest"}, "mars": {"site": "crater"}})
+
+    assert diff_state(OLD, new)["patch"] == {"meta": {"earth": {"site": "forest"}}}
+
+
+def test_diff_round_trips():
+    new = {
+        "round": 2,
+        "livin_dna": ["timber"],
+        "feedback_history": OLD["feedback_history"] + [{"round": 2, "feedback": "smaller"}],
+        "meta": {"earth": {"site": "lake", "orientation": "south"}},
+        "confirmed_preferences": ["porch"]
+    }
+
+    assert apply(OLD, diff_state(OLD, new)) == new
+
+
+def test_update_bumps_version_and_returns_diff():
+    async def scenario():
+        sessions = SessionManager(MemoryTaskStore())
+        record = await sessions.create({"livin_dna": ["timber"]})
+        return await sessions.update(record["id"], {"livin_dna": ["stone"]}, expected_version=1)
+
+    record, diff = asyncio.run(scenario())
+
+    assert record["version"] == 2
+    assert record["state"]["livin_dna"] == ["stone"]
+    assert diff["patch"] == {"livin_dna": ["stone"]}
+    assert (diff["base_version"], diff["version"]) == (1, 2)
+
+
+def test_no_op_update_keeps_version():
+    async def scenario():
+        sessions = SessionManager(MemoryTaskStore())
+        record = await sessions.create({"livin_dna": ["timber"]})
+        return await sessions.update(record["id"], {"livin_dna": ["timber"]})
+
+    record, diff = asyncio.run(scenario())
+
+    assert record["version"] == 1
+    assert diff["version"] == 1
+
+
+def test_stale_version_conflicts():
+    async def scenario():
+        sessions = SessionManager(MemoryTaskStore())
+        record = await sessions.create()
+        await sessions.update(record["id"], {"round": 1})
+        await sessions.update(record["id"], {"round": 2}, expected_version=1)
+
+    with pytest.raises(VersionConflictError) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.current_version == 2
+
+
+def test_unknown_session_returns_none():
+    async def scenario():
+        sessions = SessionManager(MemoryTaskStore())
+        return await sessions.update("missing", {"round": 1}), await sessions.replace("missing", {})
+
+    assert asyncio.run(scenario()) == (None, None)
+
+
+def test_session_evicted_during_save_returns_none():
+    class EvictingStore(MemoryTaskStore):
+        async def update(self, task_id, fields):
+            await self.delete(task_id)
+            return await super().update(task_id, fields)
+
+    async def scenario():
+        sessions = SessionManager(EvictingStore())
+        record = await sessions.create()
+        return await sessions.replace(record["id"], {"round": 5})
+
+    assert asyncio.run(scenario()) is None
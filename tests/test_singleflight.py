@@ -0,0 +1,126 @@
+"""Tests for single-flight call coalescing."""
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight, request_key
+
+
+def test_request_key_ignores_argument_order():
+    assert request_key(prompt="p", size="s") == request_key(size="s", prompt="p")
+    assert request_key(prompt="p", size="s") != request_key(prompt="p", size="t")
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.run("k", fetch, 21) for _ in range(5)])
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+
+    assert results == [42] * 5
+    assert calls == [21]
+    assert flight.stats() == {"calls": 1, "shared": 4, "in_flight": 0}
+
+
+def test_different_keys_do_not_share():
+    async def fetch(value):
+        await asyncio.sleep(0)
+        return value
+
+    async def scenario():
+        flight = SingleFlight()
+        return flight, await asyncio.gather(flight.run("a", fetch, 1), flight.run("b", fetch, 2))
+
+    flight, results = asyncio.run(scenario())
+
+    assert results == [1, 2]
+    assert flight.calls == 2
+
+
+def test_failure_reaches_every_waiter():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(*[flight.run("k", fail) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert [type(r) for r in results] == [ValueError] * 3
+
+
+def test_key_is_released_after_completion():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        flight = SingleFlight()
+        first = await flight.run("k", fetch)
+        second = await flight.run("k", fetch)
+        return flight, first, second
+
+    flight, first, second = asyncio.run(scenario())
+
+    assert (first, second) == (1, 2)
+    assert "k" not in flight
+
+
+def test_cancelling_one_waiter_keeps_the_call():
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight()
+        leaving = asyncio.create_task(flight.run("k", fetch))
+        staying = asyncio.create_task(flight.run("k", fetch))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_cancelling_the_last_waiter_cancels_the_call():
+    events = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        events.append("finished")
+
+    async def scenario():
+        flight = SingleFlight()
+        waiters = [asyncio.create_task(flight.run("k", fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        # The key is free at once, so the next caller starts a fresh call
+        assert "k" not in flight
+        await asyncio.sleep(0.01)
+        return flight
+
+    flight = asyncio.run(scenario())
+
+    assert events == ["cancelled"]
+    assert flight.stats()["in_flight"] == 0
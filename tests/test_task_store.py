@@ -0,0 +1,94 @@
+"""Tests for the bounded task stores."""
+import asyncio
+import types
+
+import pytest
+
+from services.task_store import MemoryTaskStore, SQLiteTaskStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Store clock under test control."""
+    now = [1000.0]
+    monkeypatch.setattr(
+        "services.task_store.time",
+        types.SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0])
+    )
+    return now
+
+
+def test_oldest_record_is_evicted_over_max_entries():
+    async def scenario():
+        store = MemoryTaskStore(max_entries=2)
+        for task_id in ("a", "b", "c"):
+            await store.create(task_id, {"id": task_id})
+        return [await store.get(task_id) for task_id in ("a", "b", "c")], await store.count()
+
+    records, count = asyncio.run(scenario())
+
+    assert records == [None, {"id": "b"}, {"id": "c"}]
+    assert count == 2
+
+
+def test_update_refreshes_eviction_order():
+    async def scenario():
+        store = MemoryTaskStore(max_entries=2)
+        await store.create("a", {})
+        await store.create("b", {})
+        await store.update("a", {"status": "running"})
+        await store.create("c", {})
+        return await store.get("a"), await store.get("b")
+
+    assert asyncio.run(scenario()) == ({"status": "running"}, None)
+
+
+def test_expired_records_are_dropped(clock):
+    async def scenario():
+        store = MemoryTaskStore(ttl_seconds=60)
+        await store.create("old", {})
+        clock[0] += 30
+        await store.create("new", {})
+        clock[0] += 31
+        return await store.get("old"), await store.get("new"), await store.count()
+
+    assert asyncio.run(scenario()) == (None, {}, 1)
+
+
+def test_update_of_missing_record_returns_none():
+    async def scenario():
+        store = MemoryTaskStore()
+        return await store.update("missing", {"status": "done"})
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_records_are_returned_as_copies():
+    async def scenario():
+        store = MemoryTaskStore()
+        await store.create("a", {"status": "queued"})
+        (await store.get("a"))["status"] = "changed"
+        return await store.get("a")
+
+    assert asyncio.run(scenario()) == {"status": "queued"}
+
+
+def test_sqlite_store_prunes_to_max_entries(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(SQLiteTaskStore, "PRUNE_EVERY", 1)
+
+    async def scenario():
+        store = SQLiteTaskStore(str(tmp_path / "tasks.db"), max_entries=2, ttl_seconds=60)
+        try:
+            for task_id in ("a", "b", "c"):
+                clock[0] += 1
+                await store.create(task_id, {"id": task_id})
+            record = await store.update("c", {"status": "done"})
+            return record, await store.get("a"), await store.count()
+        finally:
+            await store.close()
+
+    record, evicted, count = asyncio.run(scenario())
+
+    assert record == {"id": "c", "status": "done"}
+    assert evicted is None
+    assert count == 2